@@ -2,6 +2,8 @@ from flask import Flask
 from flask_cors import CORS
 from .config import Config
 from .database import db_manager
+from .utils.jobs import job_manager
+from .utils.invalidation import cache_invalidator
 import logging
 import os
 
@@ -24,6 +26,10 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    # Fail at startup rather than on every image request
+    from .utils.derivatives import check_negotiated_formats
+    check_negotiated_formats(app.config['IMAGE_NEGOTIATED_FORMATS'])
+
     # Initialize MongoDB (will not crash if connection fails)
     try:
         db_manager.init_app(app)
@@ -34,6 +40,12 @@ def create_app():
     except Exception as e:
         logger.error(f"MongoDB initialization failed: {e}")
 
+    # Background worker pool for comic generation jobs
+    job_manager.init_app(app)
+
+    # Evict cached responses when other processes change comics
+    cache_invalidator.init_app(app)
+
     # Enable CORS for all routes, using environment-based origins
     CORS(app, origins=app.config['CORS_ORIGINS'])
 
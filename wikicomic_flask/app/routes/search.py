@@ -1,122 +1,415 @@
-from flask import Blueprint, render_template, request, jsonify, current_app
+from flask import Blueprint, render_template, request, jsonify, current_app, Response
 from ..utils.wikiextract import WikipediaExtractor
 from ..utils.storygen import StoryGenerator
 from ..utils.imagegen import ComicImageGenerator
+from ..config import Config
 from ..database import db_manager
+from ..utils.cache import PersistentCache
+from ..utils.jobs import job_manager, JobQueueFull
+from ..utils.aio import async_runner
+import asyncio
 import logging
 import time
+import uuid
+import json
+import queue
 
 logger = logging.getLogger(__name__)
 search_bp = Blueprint('search', __name__)
 
 # Initialize utilities
-wiki = WikipediaExtractor()
+wiki = WikipediaExtractor(cache=PersistentCache(
+    "wiki",
+    store=db_manager,
+    max_entries=Config.WIKI_CACHE_MAX_ENTRIES,
+    ttl=Config.WIKI_CACHE_TTL,
+    local_entries=64
+))
 storygen = StoryGenerator()
 comicgen = ComicImageGenerator()
 
+# Storyline and scenes from a GET preview, reused by the confirming POST
+previews = PersistentCache(
+    "preview",
+    store=db_manager,
+    max_entries=Config.PREVIEW_MAX_ENTRIES,
+    ttl=Config.PREVIEW_TTL,
+    local_entries=64
+)
+
+# Article fields the pipeline uses; fetched together in one MediaWiki request
+ARTICLE_FIELDS = ("title", "url", "content", "summary", "categories", "revision_id")
+
+
+class ComicGenerationError(Exception):
+    """Raised when a stage of the comic pipeline produces no output"""
+
+
+def _noop_report(stage, **data):
+    pass
+
+
+async def _with_app_context(app, coro):
+    with app.app_context():
+        return await coro
+
+
+def _run_sync(coro):
+    """Run a pipeline coroutine on the shared loop with the current app context"""
+    app = current_app._get_current_object()
+    return async_runner.run(_with_app_context(app, coro))
+
+
+async def _fetch_article(query, report=_noop_report):
+    """
+    Fetch the Wikipedia article for a query
+
+    Returns:
+        Tuple of (result, page_info)
+
+    Raises:
+        ComicGenerationError: if the article cannot be fetched
+    """
+    # Get Wikipedia page info
+    page_info = await asyncio.to_thread(wiki.get_page_info, query, fields=ARTICLE_FIELDS)
+    if "error" in page_info:
+        raise ComicGenerationError(page_info.get("message", "Failed to fetch Wikipedia article"))
+
+    result = {
+        "title": page_info.get("title"),
+        "summary": page_info.get("summary"),
+        "url": page_info.get("url")
+    }
+    report("wiki", title=result["title"])
+
+    return result, page_info
+
+
+def _article_context(page_info):
+    """Content, summary and categories used as story generation input"""
+    content = page_info.get("content", "")
+    summary = page_info.get("summary", "")
+    categories = page_info.get("categories", [])[:5]
+    return content, summary, categories
+
+
+async def _generate_structured_story(query, page_info, style, length, report=_noop_report):
+    """
+    Generate storyline and scenes in one call when SINGLE_CALL_STORY is enabled
+
+    Returns:
+        Tuple of (storyline, scenes), or None to use the two-call path
+    """
+    if not current_app.config.get('SINGLE_CALL_STORY', False):
+        return None
+
+    content, summary, categories = _article_context(page_info)
+    structured = await storygen.agenerate_storyline_and_scenes(
+        query, content, summary, categories,
+        target_length=length, style=style,
+        revision_id=page_info.get("revision_id")
+    )
+    if not structured:
+        logger.warning("Single-call story generation failed, falling back to two calls")
+        return None
+
+    storyline, scenes = structured
+    report("storyline")
+    report("scenes", scenes_total=len(scenes), scenes=scenes)
+    return storyline, scenes
+
+
+async def _generate_storyline(query, page_info, style, length, report=_noop_report):
+    """
+    Turn a Wikipedia article into a storyline
+
+    Raises:
+        ComicGenerationError: if no storyline is generated
+    """
+    content, summary, categories = _article_context(page_info)
+
+    storyline = await storygen.agenerate_storyline(
+        query, content, summary, categories,
+        target_length=length, style=style,
+        revision_id=page_info.get("revision_id")
+    )
+    if not storyline:
+        logger.error("Storyline generation failed")
+        raise ComicGenerationError("Failed to generate storyline")
+    report("storyline")
+
+    return storyline
+
+
+async def _generate_scenes(query, storyline, style, length, revision_id=None, report=_noop_report):
+    """
+    Turn a storyline into scene prompts and dialogues
+
+    Raises:
+        ComicGenerationError: if no scenes are generated
+    """
+    scenes = await storygen.agenerate_scene_prompts_and_dialogues(
+        query, storyline, target_length=length, comic_style=style,
+        revision_id=revision_id
+    )
+    if not scenes:
+        logger.error("Scene generation failed")
+        raise ComicGenerationError("Failed to generate scenes")
+    report("scenes", scenes_total=len(scenes), scenes=scenes)
+
+    return scenes
+
+
+async def _agenerate_story(query, style, length, report=_noop_report):
+    """
+    Fetch the Wikipedia article and turn it into a storyline and scenes
+
+    Returns:
+        Tuple of (result, storyline, scenes)
+
+    Raises:
+        ComicGenerationError: if a stage fails
+    """
+    result, page_info = await _fetch_article(query, report)
+
+    structured = await _generate_structured_story(query, page_info, style, length, report)
+    if structured:
+        storyline, scenes = structured
+    else:
+        storyline = await _generate_storyline(query, page_info, style, length, report)
+        scenes = await _generate_scenes(query, storyline, style, length, page_info.get("revision_id"), report)
+
+    return result, storyline, scenes
+
+
+def _generate_story(query, style, length, report=_noop_report):
+    return _run_sync(_agenerate_story(query, style, length, report))
+
+
+def _store_preview(query, style, length, result, storyline, scenes):
+    """Keep a previewed story server-side and return its token"""
+    token = uuid.uuid4().hex
+    try:
+        previews.set(token, {
+            "query": query,
+            "style": style,
+            "length": length,
+            "result": result,
+            "storyline": storyline,
+            "scenes": scenes
+        })
+    except Exception as e:
+        logger.warning(f"Failed to store preview for {query}: {e}")
+        return None
+    return token
+
+
+def _load_preview(token, query, style, length):
+    """
+    Get a stored preview for a POST, or None if it expired or was made
+    for different parameters
+    """
+    if not token:
+        return None
+    try:
+        preview = previews.get(token)
+    except Exception as e:
+        logger.warning(f"Failed to load preview {token}: {e}")
+        return None
+    if not preview:
+        logger.info(f"Preview {token} expired or unknown, regenerating story")
+        return None
+    if (preview["query"], preview["style"], preview["length"]) != (query, style, length):
+        logger.info(f"Preview {token} does not match the request, regenerating story")
+        return None
+    return preview
+
+
+async def _stream_scenes(query, storyline, style, length, scenes, revision_id=None, report=_noop_report):
+    """
+    Yield scenes from the streaming scene generator as they are decoded
+
+    Each scene is also appended to scenes, which holds the full list once the
+    generator is exhausted.
+    """
+    async for scene in storygen.astream_scene_prompts_and_dialogues(
+        query, storyline, target_length=length, comic_style=style,
+        revision_id=revision_id
+    ):
+        scenes.append(scene)
+        report("scene_parsed", scene=scene)
+        yield scene
+
+    if scenes:
+        report("scenes", scenes_total=len(scenes), scenes=scenes)
+
+
+async def _agenerate_comic(query, style, length, report=_noop_report, preview=None):
+    """
+    Run the full pipeline: Wikipedia, storyline, scenes, then images in MongoDB
+
+    With a preview from _load_preview, its storyline and scenes are used and
+    only the images are generated.
+
+    Returns:
+        Dictionary with the same fields as the /search JSON response
+    """
+    start_time = time.time()
+    logger.info(f"Starting comic generation for: {query}")
+
+    # Check if MongoDB is connected
+    if not db_manager.connected:
+        logger.error("MongoDB not connected for comic generation")
+        raise ComicGenerationError("Database not connected. Please check MongoDB configuration.")
+
+    comic_id = None
+
+    def on_progress(event, data):
+        nonlocal comic_id
+        if event == "scene":
+            report(
+                "scene",
+                scene_number=data["scene_number"],
+                image_id=data["image_id"],
+                image_url=data["image_url"],
+                dialogue=data["dialogue"]
+            )
+        elif event == "comic":
+            comic_id = data["comic_id"]
+            report("stored", comic_id=comic_id)
+
+    if preview:
+        # The GET preview already produced the story; only images remain
+        result = preview["result"]
+        structured = (preview["storyline"], preview["scenes"])
+        report("preview", scenes_total=len(preview["scenes"]))
+    else:
+        result, page_info = await _fetch_article(query, report)
+        structured = await _generate_structured_story(query, page_info, style, length, report)
+
+    if structured:
+        storyline, scenes = structured
+        report("images", scenes_total=len(scenes))
+        comic_scenes = await comicgen.agenerate_all_images(
+            query, scenes, style=style, progress_callback=on_progress
+        )
+    elif current_app.config.get('STREAM_SCENES', True):
+        # Start each image as soon as its scene is parsed,
+        # overlapping image generation with LLM decoding
+        storyline = await _generate_storyline(query, page_info, style, length, report)
+        scenes = []
+        report("images", scenes_total=storygen.expected_scene_count(length))
+        comic_scenes = await comicgen.agenerate_all_images(
+            query, _stream_scenes(
+                query, storyline, style, length, scenes, page_info.get("revision_id"), report
+            ),
+            style=style, progress_callback=on_progress
+        )
+        if not scenes:
+            logger.error("Scene generation failed")
+            raise ComicGenerationError("Failed to generate scenes")
+    else:
+        storyline = await _generate_storyline(query, page_info, style, length, report)
+        scenes = await _generate_scenes(query, storyline, style, length, page_info.get("revision_id"), report)
+
+        # Generate comic images and store in MongoDB
+        report("images", scenes_total=len(scenes))
+        comic_scenes = await comicgen.agenerate_all_images(
+            query, scenes, style=style, progress_callback=on_progress
+        )
+
+    if not comic_scenes:
+        logger.error("Failed to generate comic images")
+        raise ComicGenerationError("Failed to generate comic images")
+
+    elapsed_time = time.time() - start_time
+    logger.info(f"Comic generation completed: {len(comic_scenes)} scenes in {elapsed_time:.1f}s")
+
+    return {
+        "result": result,
+        "storyline": storyline,
+        "scenes": scenes,
+        "images": comic_scenes,
+        "comic_id": comic_id,
+        "success": f"Comic generated successfully with {len(comic_scenes)} scenes in {elapsed_time:.1f}s!"
+    }
+
+
+def _generate_comic(query, style, length, report=_noop_report, preview=None):
+    return _run_sync(_agenerate_comic(query, style, length, report, preview))
+
+
+async def _run_comic_job(job, query, style, length, preview=None):
+    """Job entry point, run as a coroutine on the shared event loop"""
+    return await _agenerate_comic(query, style, length, report=job.report, preview=preview)
+
+
 @search_bp.route('/search', methods=['GET', 'POST'])
 def search():
     """Handle comic generation requests"""
     query = request.values.get('query', '').strip()
     style = request.values.get('style', 'Manga')
     length = request.values.get('length', 'medium')
+    preview_token = request.values.get('preview_token')
     
     # Initialize variables
     result = None
     error = None
     storyline = None
     scenes = []
+    images = []
     comic_id = None
     success = None
+    job_id = None
+    status_code = 200
 
     # Handle GET request - show form or search results
     if request.method == 'GET' and query:
         try:
-            # Get Wikipedia page info
-            page_info = wiki.get_page_info(query)
-            if "error" in page_info:
-                error = page_info.get("message", "Failed to fetch Wikipedia article")
-                logger.error(f"Wikipedia error: {error}")
-            else:
-                result = {
-                    "title": page_info.get("title"),
-                    "summary": page_info.get("summary"),
-                    "url": page_info.get("url")
-                }
-                
-                # Generate storyline and scenes
-                content = page_info.get("content", "")
-                summary = page_info.get("summary", "")
-                categories = page_info.get("categories", [])[:5]
-                
-                storyline = storygen.generate_storyline(
-                    query, content, summary, categories, 
-                    target_length=length, style=style
-                )
-                
-                scenes = storygen.generate_scene_prompts_and_dialogues(
-                    query, storyline, target_length=length, comic_style=style
-                )
-                
+            result, storyline, scenes = _generate_story(query, style, length)
+            preview_token = _store_preview(query, style, length, result, storyline, scenes)
+        except ComicGenerationError as e:
+            error = str(e)
         except Exception as e:
             error = f"Error processing request: {str(e)}"
             logger.error(f"Search error: {e}")
 
-    # Handle POST request - generate comic images
+    # Handle POST request - queue comic generation as a background job
+    elif request.method == 'POST' and query and current_app.config.get('ASYNC_GENERATION', True):
+        if not db_manager.connected:
+            error = "Database not connected. Please check MongoDB configuration."
+            logger.error("MongoDB not connected for comic generation")
+        else:
+            try:
+                job = job_manager.submit(
+                    _run_comic_job, query, style, length,
+                    preview=_load_preview(preview_token, query, style, length),
+                    params={"query": query, "style": style, "length": length}
+                )
+                job_id = job.id
+                success = "Comic generation started. Poll the job status for progress."
+                status_code = 202
+            except JobQueueFull as e:
+                error = "Too many comics are being generated right now. Please try again shortly."
+                status_code = 503
+                logger.warning(f"Rejected comic job for {query}: {e}")
+
+    # Handle POST request - generate comic images inline
     elif request.method == 'POST' and query:
         start_time = time.time()
         try:
-            logger.info(f"Starting comic generation for: {query}")
-            
-            # Check if MongoDB is connected
-            if not db_manager.connected:
-                error = "Database not connected. Please check MongoDB configuration."
-                logger.error("MongoDB not connected for comic generation")
-            else:
-                # Get Wikipedia page info
-                page_info = wiki.get_page_info(query)
-                if "error" in page_info:
-                    error = page_info.get("message", "Failed to fetch Wikipedia article")
-                else:
-                    result = {
-                        "title": page_info.get("title"),
-                        "summary": page_info.get("summary"),
-                        "url": page_info.get("url")
-                    }
-                    
-                    # Generate storyline and scenes
-                    content = page_info.get("content", "")
-                    summary = page_info.get("summary", "")
-                    categories = page_info.get("categories", [])[:5]
-                    
-                    storyline = storygen.generate_storyline(
-                        query, content, summary, categories, 
-                        target_length=length, style=style
-                    )
-                    
-                    if not storyline:
-                        error = "Failed to generate storyline"
-                        logger.error("Storyline generation failed")
-                    else:
-                        scenes = storygen.generate_scene_prompts_and_dialogues(
-                            query, storyline, target_length=length, comic_style=style
-                        )
-                        
-                        if not scenes:
-                            error = "Failed to generate scenes"
-                            logger.error("Scene generation failed")
-                        else:
-                            # Generate comic images and store in MongoDB
-                            comic_scenes = comicgen.generate_all_images(query, scenes, style=style)
-                            
-                            if comic_scenes:
-                                elapsed_time = time.time() - start_time
-                                success = f"Comic generated successfully with {len(comic_scenes)} scenes in {elapsed_time:.1f}s!"
-                                logger.info(f"Comic generation completed: {len(comic_scenes)} scenes in {elapsed_time:.1f}s")
-                            else:
-                                error = "Failed to generate comic images"
-                                logger.error("Failed to generate comic images")
-                        
+            generated = _generate_comic(
+                query, style, length,
+                preview=_load_preview(preview_token, query, style, length)
+            )
+            result = generated["result"]
+            storyline = generated["storyline"]
+            scenes = generated["scenes"]
+            images = generated["images"]
+            comic_id = generated["comic_id"]
+            success = generated["success"]
+        except ComicGenerationError as e:
+            error = str(e)
         except Exception as e:
             elapsed_time = time.time() - start_time
             error = f"Error generating comic: {str(e)}"
@@ -129,12 +422,17 @@ def search():
             "error": error,
             "storyline": storyline,
             "scenes": scenes,
+            "images": images,
             "success": success,
             "comic_id": comic_id,
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}" if job_id else None,
+            "events_url": f"/search/stream/{job_id}" if job_id else None,
+            "preview_token": preview_token if request.method == 'GET' else None,
             "query": query,
             "style": style,
             "length": length
-        })
+        }), status_code
 
     # Render HTML template
     return render_template(
@@ -145,11 +443,123 @@ def search():
         scenes=scenes,
         success=success,
         comic_id=comic_id,
+        preview_token=preview_token if request.method == 'GET' else None,
         query=query,
         style=style,
         length=length
+    ), status_code
+
+def _format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _stream_job_events(job, heartbeat=15):
+    """Yield a job's progress events as Server-Sent Events until it finishes"""
+    events = job.subscribe()
+    try:
+        yield _format_sse("queued", {"job_id": job.id})
+        while True:
+            try:
+                event, data = events.get(timeout=heartbeat)
+            except queue.Empty:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            yield _format_sse(event, data)
+            if event in ("done", "error"):
+                break
+    finally:
+        job.unsubscribe(events)
+
+
+def _poll_job_events(job_id, interval, heartbeat=15):
+    """Yield the persisted events of a job running in another process until it finishes"""
+    sent = 0
+    idle = 0
+    yield _format_sse("queued", {"job_id": job_id})
+    while True:
+        state = job_manager.stored(job_id)
+        if state is None:
+            yield _format_sse("error", {"error": "Job not found"})
+            return
+        events = state.get("events", [])
+        for item in events[sent:]:
+            yield _format_sse(item["event"], item["data"])
+            if item["event"] in ("done", "error"):
+                return
+        if len(events) > sent:
+            sent = len(events)
+            idle = 0
+        elif idle >= heartbeat:
+            yield ": keep-alive\n\n"
+            idle = 0
+        time.sleep(interval)
+        idle += interval
+
+
+def _sse_response(events):
+    return Response(
+        events,
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Disable proxy buffering so events arrive immediately
+        }
     )
 
+
+@search_bp.route('/search/stream', methods=['GET', 'POST'])
+def search_stream():
+    """
+    Generate a comic and stream per-stage progress as Server-Sent Events
+
+    Emits wiki, storyline, scenes, images, one scene event per stored image
+    (with its image_url), stored (with the comic_id), then done or error.
+    With STREAM_SCENES enabled, a scene_parsed event is also sent as each
+    scene is decoded. A valid preview_token from GET /search replaces the
+    wiki, storyline and scenes events with a single preview event.
+    """
+    query = request.values.get('query', '').strip()
+    style = request.values.get('style', 'Manga')
+    length = request.values.get('length', 'medium')
+    preview_token = request.values.get('preview_token')
+
+    if not query:
+        return jsonify({"error": "Query is required"}), 400
+
+    if not db_manager.connected:
+        logger.error("MongoDB not connected for comic generation")
+        return jsonify({"error": "Database not connected. Please check MongoDB configuration."}), 503
+
+    try:
+        job = job_manager.submit(
+            _run_comic_job, query, style, length,
+            preview=_load_preview(preview_token, query, style, length),
+            params={"query": query, "style": style, "length": length}
+        )
+    except JobQueueFull as e:
+        logger.warning(f"Rejected comic stream for {query}: {e}")
+        return jsonify({"error": "Too many comics are being generated right now. Please try again shortly."}), 503
+
+    return _sse_response(_stream_job_events(job))
+
+@search_bp.route('/search/stream/<job_id>', methods=['GET'])
+def search_stream_job(job_id):
+    """
+    Stream the progress of a job started earlier, as /search/stream does
+
+    Jobs running in this process are followed directly; jobs running in
+    another worker are followed by polling their persisted state every
+    JOB_EVENTS_POLL_INTERVAL seconds. Events emitted before the request
+    are replayed first.
+    """
+    job = job_manager.get(job_id)
+    if job is not None:
+        return _sse_response(_stream_job_events(job))
+    if job_manager.stored(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    return _sse_response(_poll_job_events(job_id, current_app.config.get('JOB_EVENTS_POLL_INTERVAL', 1)))
+
 @search_bp.route('/suggest', methods=['GET'])
 def suggest():
     """Get Wikipedia search suggestions"""
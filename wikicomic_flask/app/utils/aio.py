@@ -0,0 +1,63 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Coroutine, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRunner:
+    """
+    One background event loop shared by the whole process
+
+    The async Groq and Gemini clients are bound to the loop they first run
+    on, so every coroutine that uses them is scheduled here. Synchronous code
+    calls run() or iterate(); coroutine jobs are scheduled with submit().
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        # Started lazily so worker processes forked after import get their own loop
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="async-runner",
+                    daemon=True
+                )
+                self._thread.start()
+                logger.info("Async runner loop started")
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the loop and return a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: float = None) -> Any:
+        """Run a coroutine to completion from synchronous code"""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("AsyncRunner.run() cannot block its own event loop")
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, agen: AsyncIterator) -> Iterator:
+        """Iterate an async generator from synchronous code"""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+
+# Global instance
+async_runner = AsyncRunner()
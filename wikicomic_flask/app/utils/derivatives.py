@@ -0,0 +1,124 @@
+import logging
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+from PIL import Image
+from werkzeug.datastructures import MIMEAccept
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+# Formats derivatives can be encoded in, by preference when negotiating
+DERIVATIVE_FORMATS = {
+    "avif": "image/avif",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "png": "image/png"
+}
+
+# Pillow save options per format
+_SAVE_OPTIONS = {
+    "avif": lambda quality: {"quality": quality},
+    "webp": lambda quality: {"quality": quality, "method": 4},
+    "jpeg": lambda quality: {"quality": quality, "optimize": True, "progressive": True},
+    "png": lambda quality: {"optimize": True}
+}
+
+
+def _encodable(fmt: str) -> bool:
+    Image.init()
+    return fmt.upper() in Image.SAVE
+
+
+def check_negotiated_formats(formats: List[str]):
+    """
+    Validate IMAGE_NEGOTIATED_FORMATS when the app is created
+
+    Raises:
+        ValueError: for a format that is not in DERIVATIVE_FORMATS
+    """
+    unknown = [fmt for fmt in formats if fmt not in DERIVATIVE_FORMATS]
+    if unknown:
+        raise ValueError(f"IMAGE_NEGOTIATED_FORMATS has unknown formats: {', '.join(unknown)}. "
+                         f"Available: {', '.join(DERIVATIVE_FORMATS)}")
+
+
+def negotiate_format(requested: Optional[str], accept: MIMEAccept) -> str:
+    """
+    Pick the output format from ?format= or the Accept header
+
+    Only formats the client lists explicitly with a non-zero q-value are
+    negotiated (image/* and */* do not opt in); the highest q wins, ties
+    going to the IMAGE_NEGOTIATED_FORMATS order. Falls back to png, the
+    format originals are stored in.
+
+    Args:
+        requested: ?format= value, if any
+        accept: Parsed Accept header (request.accept_mimetypes)
+
+    Raises:
+        ValueError: if requested is not a supported format
+    """
+    if requested:
+        fmt = requested.lower()
+        if fmt == "jpg":
+            fmt = "jpeg"
+        if fmt not in DERIVATIVE_FORMATS or not _encodable(fmt):
+            raise ValueError(f"format must be one of: {', '.join(f for f in DERIVATIVE_FORMATS if _encodable(f))}")
+        return fmt
+
+    listed = {value.lower(): quality for value, quality in accept}
+    best, best_quality = "png", 0
+    for fmt in Config.IMAGE_NEGOTIATED_FORMATS:
+        quality = listed.get(DERIVATIVE_FORMATS[fmt], 0)
+        if quality > best_quality and _encodable(fmt):
+            best, best_quality = fmt, quality
+    return best
+
+
+def snap_width(requested: Optional[str]) -> int:
+    """
+    Round a requested ?w= up to the nearest configured derivative width
+
+    Widths are limited to IMAGE_DERIVATIVE_WIDTHS so arbitrary values do
+    not each create a stored copy. Returns 0 (original width) when no
+    width is requested or it exceeds every configured width.
+
+    Raises:
+        ValueError: if the width is not a positive integer
+    """
+    if not requested:
+        return 0
+    try:
+        width = int(requested)
+    except ValueError:
+        raise ValueError("w must be an integer")
+    if width < 1:
+        raise ValueError("w must be positive")
+    for allowed in sorted(Config.IMAGE_DERIVATIVE_WIDTHS):
+        if width <= allowed:
+            return allowed
+    return 0
+
+
+def make_derivative(data: bytes, width: int, fmt: str) -> Tuple[bytes, str]:
+    """
+    Resize an image to width (0 keeps the original) and encode it as fmt
+
+    Images are never upscaled.
+
+    Returns:
+        Tuple of (image bytes, content type)
+    """
+    image = Image.open(BytesIO(data))
+    if width and image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+
+    if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    buffer = BytesIO()
+    image.save(buffer, format=fmt.upper(), **_SAVE_OPTIONS[fmt](Config.IMAGE_DERIVATIVE_QUALITY))
+    return buffer.getvalue(), DERIVATIVE_FORMATS[fmt]
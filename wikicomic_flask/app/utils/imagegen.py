@@ -6,10 +6,13 @@ from PIL import Image, ImageEnhance
 from google import genai
 from google.genai import types
 import re
+import hashlib
+from ..config import Config
 from ..database import db_manager
+from .aio import async_runner
+from .cache import DiskCache, register_cache
 import asyncio
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +20,15 @@ def sanitize_filename(name: str) -> str:
     return re.sub(r'[\/*?:"<>|]', "_", name).strip()
 
 class ComicImageGenerator:
+    """
+    Comic page generation with Gemini
+
+    The async methods run on the shared async_runner loop; the sync methods
+    are thin wrappers that block on them.
+    """
+
+    IMAGE_MODEL = "gemini-2.0-flash-preview-image-generation"
+
     STYLE_SETTINGS = {
         'Manga': {
             'prompt': """professional manga comic book page, ultra-detailed manga art style, dynamic action poses with fluid motion lines, large expressive eyes with detailed iris and highlights, flowing hair with individual strands and movement, speed lines and motion effects, dramatic lighting with strong shadows and highlights, emotional facial expressions with clear emotion, clean precise line art with varying line weights, vibrant saturated colors with perfect contrast, multiple comic panels with clear borders and gutters, professional manga page layout with proper panel flow, detailed character designs with distinctive features, background details that enhance storytelling, atmospheric lighting effects, detailed clothing with folds and textures, expressive hand gestures and body language, cinematic camera angles and compositions, high-quality shading and highlights, professional comic book typography, clear visual hierarchy, balanced composition with proper use of negative space, manga-style character proportions, detailed environmental elements, mood-setting color palettes, professional inking techniques, clear visual storytelling flow""",
@@ -62,8 +74,18 @@ class ComicImageGenerator:
             raise ValueError("GEMINI_API_KEY environment variable is not set")
 
         self.client = genai.Client(api_key=self.api_key)
-        self._executor = ThreadPoolExecutor(max_workers=3)  # Limit concurrent requests
-        self._cache = {}
+        self._semaphore = asyncio.Semaphore(Config.GEMINI_MAX_CONCURRENCY)  # Limit concurrent requests
+        self._cache = None
+        if Config.IMAGE_CACHE_DIR:
+            try:
+                self._cache = DiskCache(Config.IMAGE_CACHE_DIR, Config.IMAGE_CACHE_MAX_BYTES)
+                register_cache("images", self._cache)
+            except OSError as e:
+                logger.warning(f"Image cache disabled: {e}")
+
+    def _cache_key(self, full_prompt):
+        """Content address of an image: hash of the model and the final prompt"""
+        return hashlib.sha256(f"{self.IMAGE_MODEL}\n{full_prompt}".encode('utf-8')).hexdigest()
 
     def _enhance_prompt(self, scene_prompt, style="Manga", dialogue=None):
         style_settings = self.STYLE_SETTINGS.get(style, self.STYLE_SETTINGS['Manga'])
@@ -172,101 +194,151 @@ class ComicImageGenerator:
             logger.warning(f"Image post-processing failed: {e}")
         return image
 
+    def _encode_image(self, data: bytes) -> bytes:
+        """Post-process raw Gemini image bytes into the PNG we store"""
+        image = Image.open(BytesIO(data))
+        image = self._post_process_image(image)
+
+        # Convert to bytes with high quality
+        img_buffer = BytesIO()
+        image.save(img_buffer, format='PNG', optimize=True, quality=95)
+        img_buffer.seek(0)
+        return img_buffer.getvalue()
+
     def generate_comic_image(self, prompt, style="Manga", dialogue=None):
+        """Synchronous wrapper around agenerate_comic_image"""
+        return async_runner.run(self.agenerate_comic_image(prompt, style, dialogue))
+
+    async def agenerate_comic_image(self, prompt, style="Manga", dialogue=None):
         """
         Generate a comic image and return the image data as bytes
         """
         start_time = time.time()
         full_prompt = self._enhance_prompt(prompt, style, dialogue)
 
+        # Identical prompts reuse the stored image instead of a new Gemini call
+        cache_key = self._cache_key(full_prompt)
+        if self._cache is not None:
+            cached = await asyncio.to_thread(self._cache.get, cache_key)
+            if cached:
+                logger.info("Image served from prompt cache")
+                return cached
+
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash-preview-image-generation",
-                contents=full_prompt,
-                config=types.GenerateContentConfig(
-                    response_modalities=['TEXT', 'IMAGE']
+            async with self._semaphore:
+                response = await asyncio.wait_for(
+                    self.client.aio.models.generate_content(
+                        model=self.IMAGE_MODEL,
+                        contents=full_prompt,
+                        config=types.GenerateContentConfig(
+                            response_modalities=['TEXT', 'IMAGE']
+                        )
+                    ),
+                    timeout=60  # 60 second timeout per image
                 )
-            )
 
             for part in response.candidates[0].content.parts:
                 if hasattr(part, "inline_data") and part.inline_data is not None:
-                    image = Image.open(BytesIO(part.inline_data.data))
-                    image = self._post_process_image(image)
-
-                    # Convert to bytes with high quality
-                    img_buffer = BytesIO()
-                    image.save(img_buffer, format='PNG', optimize=True, quality=95)
-                    img_buffer.seek(0)
+                    # Pillow work is CPU-bound; keep it off the event loop
+                    image_bytes = await asyncio.to_thread(self._encode_image, part.inline_data.data)
+                    if self._cache is not None:
+                        await asyncio.to_thread(self._cache.set, cache_key, image_bytes)
                     
                     elapsed_time = time.time() - start_time
                     logger.info(f"Image generated in {elapsed_time:.2f}s")
-                    return img_buffer.getvalue()
+                    return image_bytes
                 elif hasattr(part, "text") and part.text:
                     logger.info(f"Gemini Text Output: {part.text}")
 
             logger.error("No image found in Gemini response.")
         except Exception as e:
-            logger.error(f"Error generating image with Gemini: {e}")
+            logger.error(f"Error generating image with Gemini: {e!r}")
 
         return None
 
-    def generate_all_images(self, title, scenes, style="Manga"):
+    def generate_all_images(self, title, scenes, style="Manga", progress_callback=None):
+        """Synchronous wrapper around agenerate_all_images"""
+        return async_runner.run(self.agenerate_all_images(title, scenes, style, progress_callback))
+
+    async def _aiter_scenes(self, scenes):
+        """Iterate scenes given as a list, an async iterable or a blocking iterator"""
+        if isinstance(scenes, (list, tuple)):
+            for scene in scenes:
+                yield scene
+        elif hasattr(scenes, '__aiter__'):
+            async for scene in scenes:
+                yield scene
+        else:
+            # e.g. a sync generator still waiting on the LLM; pull it from a worker thread
+            iterator = iter(scenes)
+            done = object()
+            while True:
+                scene = await asyncio.to_thread(next, iterator, done)
+                if scene is done:
+                    break
+                yield scene
+
+    async def agenerate_all_images(self, title, scenes, style="Manga", progress_callback=None):
         """
-        Generate all images for a comic with parallel processing
+        Generate all images for a comic concurrently
+
+        Each scene is started as soon as it arrives, so scenes may be an async
+        iterator still being decoded. Concurrent Gemini calls are limited by
+        GEMINI_MAX_CONCURRENCY across all comics in the process.
+
+        progress_callback(event, data), if given, is called with "scene" and the
+        scene data as each image is stored, and with "comic" and the comic id
+        once the comic metadata is saved.
         """
         start_time = time.time()
-        scene_data = []
-        stored_image_ids = []
+        # Images are stored under the comic's id before the comic itself exists
+        comic_id = db_manager.new_comic_id()
 
-        # Process images in parallel with limited concurrency
-        futures = []
-        for idx, scene in enumerate(scenes):
+        tasks = []
+        idx = 0
+        async for scene in self._aiter_scenes(scenes):
             prompt = scene.get("prompt", f"Scene {idx+1}")
             dialogue = scene.get("dialogue", "")
-            
-            future = self._executor.submit(
-                self._generate_and_store_image,
-                title, prompt, dialogue, style, idx
-            )
-            futures.append((idx, future))
-
-        # Collect results
-        for idx, future in futures:
-            try:
-                result = future.result(timeout=60)  # 60 second timeout per image
-                if result:
-                    scene_data.append(result)
-                    stored_image_ids.append(result["image_id"])
-            except Exception as e:
-                logger.error(f"Failed to generate image for scene {idx+1}: {e}")
+            tasks.append(asyncio.create_task(
+                self._agenerate_and_store_image(title, prompt, dialogue, style, idx, progress_callback, comic_id)
+            ))
+            idx += 1
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        scene_data = []
+        for idx, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to generate image for scene {idx+1}: {result}")
+            elif result:
+                scene_data.append(result)
 
         # Store comic metadata
         if scene_data:
             try:
-                comic_id = db_manager.store_comic(title, scene_data, style)
+                comic_id = await asyncio.to_thread(db_manager.store_comic, title, scene_data, style, comic_id)
+                if progress_callback:
+                    progress_callback("comic", {"comic_id": comic_id})
                 elapsed_time = time.time() - start_time
                 logger.info(f"Comic generation completed: {len(scene_data)} scenes in {elapsed_time:.1f}s")
                 return scene_data
             except Exception as e:
                 logger.error(f"Failed to store comic metadata: {e}")
                 # Clean up stored images if comic metadata storage fails
-                for image_id in stored_image_ids:
-                    try:
-                        db_manager.delete_comic(image_id)
-                    except:
-                        pass
+                await asyncio.to_thread(db_manager.delete_images, [scene["image_id"] for scene in scene_data])
 
         return scene_data
 
-    def _generate_and_store_image(self, title, prompt, dialogue, style, idx):
+    async def _agenerate_and_store_image(self, title, prompt, dialogue, style, idx, progress_callback=None,
+                                         comic_id=None):
         """Generate and store a single image"""
         try:
             # Generate image
-            image_data = self.generate_comic_image(prompt, style, dialogue)
+            image_data = await self.agenerate_comic_image(prompt, style, dialogue)
             
             if image_data:
                 # Store image in MongoDB
-                image_id = db_manager.store_image(
+                image_id = await asyncio.to_thread(
+                    db_manager.store_image,
                     image_data=image_data,
                     comic_title=title,
                     scene_number=idx + 1,
@@ -275,16 +347,20 @@ class ComicImageGenerator:
                         "prompt": prompt,
                         "style": style,
                         "scene_index": idx
-                    }
+                    },
+                    comic_id=comic_id
                 )
                 
-                return {
+                scene = {
                     "image_id": image_id,
                     "image_url": f"/api/images/{image_id}",
                     "dialogue": dialogue,
                     "prompt": prompt,
                     "scene_number": idx + 1
                 }
+                if progress_callback:
+                    progress_callback("scene", scene)
+                return scene
         except Exception as e:
             logger.error(f"Failed to generate and store scene {idx+1}: {e}")
         
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from typing import Any, Dict
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from ..database import db_manager
+
+logger = logging.getLogger(__name__)
+
+
+class CacheInvalidator:
+    """
+    Evicts this process's cached responses when another process changes comics
+
+    The process that stores or deletes a comic invalidates its own cache
+    and the shared cache collection directly; this keeps every other
+    process's in-memory entries in step, and purges deleted images from
+    its local disk cache. Modes (CACHE_INVALIDATION):
+
+        watch    tail a change stream on the comics and images collections,
+                 falling back to poll when change streams are unavailable
+        poll     poll the invalidation log from a background thread
+        request  poll the invalidation log at most once per interval from
+                 incoming requests, for serverless instances that cannot
+                 keep threads alive between requests
+        off      rely on TTLs
+    """
+
+    MODES = ("watch", "poll", "request", "off")
+
+    def __init__(self, app=None):
+        self.mode = "off"
+        self.interval = 5
+        self._seq = None
+        self._next_poll = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+        self.watching = False
+        self.events = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the mode from the app config and hook into incoming requests"""
+        self.mode = app.config.get('CACHE_INVALIDATION', 'watch')
+        self.interval = app.config.get('CACHE_INVALIDATION_POLL_INTERVAL', self.interval)
+        if self.mode not in self.MODES:
+            logger.warning(f"Unknown CACHE_INVALIDATION mode {self.mode!r}, using 'off'")
+            self.mode = "off"
+        if self.mode != "off":
+            # Threads are started on the first request rather than here, so
+            # worker processes forked after create_app() get their own
+            app.before_request(self._on_request)
+
+    def _on_request(self):
+        if not db_manager.connected or db_manager.cache_collection is None:
+            return
+        if self.mode == "request":
+            self.poll_if_due()
+        elif self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    target = self._watch if self.mode == "watch" else self._poll_forever
+                    self._thread = threading.Thread(target=target, name="cache-invalidator", daemon=True)
+                    self._thread.start()
+
+    def _evict(self, tags):
+        if tags is None:
+            db_manager.clear_cache()
+            logger.info("Cache invalidation log overrun, cleared the query cache")
+        elif tags:
+            images = [tag.split(":", 1)[1] for tag in tags if tag.startswith("image:")]
+            if images:
+                # Deleted images may still sit in this node's disk cache
+                db_manager.purge_image_files(images)
+            db_manager.invalidate_cache(*tags, shared=False)
+        else:
+            return
+        self.events += 1
+
+    def poll(self):
+        """Apply invalidations logged by other processes since the last poll"""
+        seq, tags = db_manager.invalidation_events(self._seq)
+        first = self._seq is None
+        self._seq = seq
+        if not first:
+            self._evict(tags)
+
+    def poll_if_due(self):
+        now = time.time()
+        with self._lock:
+            if now < self._next_poll:
+                return
+            self._next_poll = now + self.interval
+        try:
+            self.poll()
+        except PyMongoError as e:
+            logger.warning(f"Cache invalidation poll failed: {e}")
+
+    def _poll_forever(self):
+        logger.info(f"Polling for cache invalidations every {self.interval}s")
+        while True:
+            self.poll_if_due()
+            time.sleep(self.interval)
+
+    def _watch(self):
+        """Tail the comics and images collections, evicting the tags each change affects"""
+        comics = db_manager.comics_collection.name
+        images = db_manager.images_collection.name
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": [comics, images]},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+        }}]
+        resume_token = None
+
+        while True:
+            try:
+                with db_manager.db.watch(pipeline, resume_after=resume_token) as stream:
+                    self.watching = True
+                    logger.info("Watching comics and images for cache invalidation")
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        tags = ["comics"]
+                        if change["ns"]["coll"] == comics:
+                            tags.append(f"comic:{change['documentKey']['_id']}")
+                        else:
+                            comic_id = (change.get("fullDocument") or {}).get("comic_id")
+                            if comic_id:
+                                tags.append(f"comic:{comic_id}")
+                            if change["operationType"] == "delete":
+                                tags.append(f"image:{change['documentKey']['_id']}")
+                        self._evict(tags)
+            except OperationFailure as e:
+                if resume_token is not None and e.code == 286:
+                    # ChangeStreamHistoryLost: changes were missed while reconnecting
+                    self._evict(None)
+                    resume_token = None
+                    continue
+                # Standalone servers and some hosted tiers have no change streams
+                self.watching = False
+                logger.warning(f"Change streams unavailable ({e}), polling for cache invalidations instead")
+                self._poll_forever()
+                return
+            except Exception as e:
+                self.watching = False
+                logger.warning(f"Cache invalidation change stream interrupted: {e}")
+                time.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "watching": self.watching,
+            "interval": self.interval,
+            "events": self.events,
+            "seq": self._seq
+        }
+
+
+# Global instance
+cache_invalidator = CacheInvalidator()
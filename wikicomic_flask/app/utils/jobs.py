@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Optional
+
+from ..database import db_manager
+from .aio import async_runner
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when the background pool cannot accept another job"""
+
+
+class Job:
+    """State of a single background comic generation job"""
+
+    def __init__(self, job_id: str, params: Dict[str, Any] = None):
+        self.id = job_id
+        self.params = params or {}
+        self.status = "queued"  # queued | running | completed | failed
+        self.stage = "queued"
+        self.scenes_total = 0
+        self.scenes_completed = 0
+        self.comic_id = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished_at = None
+        self._events = []
+        self._subscribers = []
+        self._listener = None  # Called with the job after every change
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def _changed(self):
+        if self._listener is not None:
+            self._listener(self)
+
+    def update(self, **fields):
+        """Update job fields from any worker thread"""
+        with self._lock:
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self.updated_at = time.time()
+        self._changed()
+
+    def _publish(self, event: str, data: Dict[str, Any]):
+        """Record an event and fan it out to subscribers (caller holds the lock)"""
+        item = (event, data)
+        self._events.append(item)
+        for subscriber in self._subscribers:
+            subscriber.put(item)
+
+    def report(self, stage: str, **data):
+        """Record pipeline progress for a stage"""
+        with self._lock:
+            self.stage = stage
+            if "scenes_total" in data:
+                self.scenes_total = data["scenes_total"]
+            if "comic_id" in data:
+                self.comic_id = data["comic_id"]
+            if stage == "scene":
+                self.scenes_completed += 1
+            self.updated_at = time.time()
+            self._publish(stage, data)
+        self._changed()
+
+    def complete(self, result: Any):
+        with self._lock:
+            self.status = "completed"
+            self.stage = "done"
+            self.result = result
+            self.finished_at = self.updated_at = time.time()
+            self._publish("done", {"result": result})
+        self._changed()
+
+    def fail(self, error: str):
+        with self._lock:
+            self.status = "failed"
+            self.stage = "failed"
+            self.error = error
+            self.finished_at = self.updated_at = time.time()
+            self._publish("error", {"error": error})
+        self._changed()
+
+    def subscribe(self) -> queue.Queue:
+        """
+        Get a queue of (event, data) tuples for this job
+
+        Events already emitted are replayed first, so late subscribers
+        still see the whole pipeline. The "done" or "error" event is last.
+        """
+        subscriber = queue.Queue()
+        with self._lock:
+            for item in self._events:
+                subscriber.put(item)
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def _dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "scenes_total": self.scenes_total,
+            "scenes_completed": self.scenes_completed,
+            "comic_id": self.comic_id,
+            "result": self.result,
+            "error": self.error,
+            "params": self.params,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "finished_at": self.finished_at
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._dict()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """to_dict plus the events emitted so far, as persisted for other processes"""
+        with self._lock:
+            state = self._dict()
+            state["events"] = [{"event": event, "data": data} for event, data in self._events]
+            return state
+
+
+class JobManager:
+    """
+    Runs comic generation jobs in the background
+
+    Coroutine functions run on the shared async_runner loop and plain
+    functions on a thread pool; either way at most max_workers jobs run at
+    once and the rest wait as queued. max_workers and max_pending apply to
+    each process.
+
+    Every change to a job is also written, in order and off the job's own
+    thread, to the cache collection, so any worker process can answer for
+    a job another one is running (see status and stored).
+    """
+
+    # Namespace of persisted job state in the cache collection
+    STORE_NAMESPACE = "jobs"
+
+    def __init__(self, app=None):
+        self._app = None
+        self._executor = None
+        self._writer = None
+        self._async_slots = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.max_workers = 2
+        self.max_pending = 20
+        self.job_ttl = 3600  # keep finished jobs for 1 hour
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the worker pool from the Flask app config"""
+        self._app = app
+        self.max_workers = app.config.get('JOB_MAX_WORKERS', self.max_workers)
+        self.max_pending = app.config.get('JOB_MAX_PENDING', self.max_pending)
+        self.job_ttl = app.config.get('JOB_RESULT_TTL', self.job_ttl)
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="comic-job"
+        )
+        self._async_slots = asyncio.Semaphore(self.max_workers)
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+
+    def _save(self, job: Job):
+        """Persist a job's state; one writer thread keeps the writes in order"""
+        if not db_manager.connected:
+            return
+        self._writer.submit(
+            db_manager.cache_set, self.STORE_NAMESPACE, job.id, job.snapshot(), self.job_ttl
+        )
+
+    def _prune(self):
+        """Drop finished jobs older than the TTL (caller holds the lock)"""
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, fn: Callable, *args, params: Dict[str, Any] = None, **kwargs) -> Job:
+        """
+        Queue fn(job, *args, **kwargs) on the event loop or the worker pool
+
+        Raises:
+            JobQueueFull: if max_pending jobs are already queued or running
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="comic-job"
+            )
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_workers)
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+
+        with self._lock:
+            self._prune()
+            active = sum(1 for job in self._jobs.values() if not job.finished)
+            if active >= self.max_pending:
+                raise JobQueueFull(f"{active} comic jobs already in progress")
+
+            job = Job(uuid.uuid4().hex, params)
+            job._listener = self._save
+            self._jobs[job.id] = job
+
+        self._save(job)
+        if asyncio.iscoroutinefunction(fn):
+            async_runner.submit(self._arun(job, fn, args, kwargs))
+        else:
+            self._executor.submit(self._run, job, fn, args, kwargs)
+        logger.info(f"Queued comic job {job.id}")
+        return job
+
+    def _run(self, job: Job, fn: Callable, args, kwargs):
+        job.update(status="running", stage="started")
+        # Jobs run with an app context so the pipeline can read current_app.config
+        context = self._app.app_context() if self._app is not None else nullcontext()
+        try:
+            with context:
+                result = fn(job, *args, **kwargs)
+            job.complete(result)
+            logger.info(f"Comic job {job.id} completed")
+        except Exception as e:
+            job.fail(str(e))
+            logger.error(f"Comic job {job.id} failed: {e}")
+
+    async def _arun(self, job: Job, fn: Callable, args, kwargs):
+        # Same worker limit as the thread pool; waiting jobs stay queued
+        async with self._async_slots:
+            await self._arun_job(job, fn, args, kwargs)
+
+    async def _arun_job(self, job: Job, fn: Callable, args, kwargs):
+        job.update(status="running", stage="started")
+        context = self._app.app_context() if self._app is not None else nullcontext()
+        try:
+            with context:
+                result = await fn(job, *args, **kwargs)
+            job.complete(result)
+            logger.info(f"Comic job {job.id} completed")
+        except Exception as e:
+            job.fail(str(e))
+            logger.error(f"Comic job {job.id} failed: {e}")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """A job submitted to this process"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stored(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Persisted state of a job submitted to any process, with its events"""
+        return db_manager.cache_get(self.STORE_NAMESPACE, job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status of a job submitted to any process, as returned by Job.to_dict"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        state = self.stored(job_id)
+        if state is not None:
+            state.pop("events", None)
+        return state
+
+
+# Global instance
+job_manager = JobManager()
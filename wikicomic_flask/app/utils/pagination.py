@@ -0,0 +1,168 @@
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional
+
+from bson import ObjectId
+
+from ..config import Config
+from ..database import MongoDBManager
+
+
+def encode_cursor(sort: str, item: Dict[str, Any], since: Optional[datetime] = None) -> str:
+    """Opaque cursor pointing just after item in the given sort order"""
+    field = sort.lstrip('-')
+    value = item.get(field)
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    payload = {
+        "s": sort,
+        "v": value,
+        "id": str(item.get("_id", "")),
+        "t": since.isoformat() if since else None
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decode a cursor from encode_cursor
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value = payload["v"]
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["$date"])
+        if payload["s"] not in MongoDBManager.COMIC_SORTS:
+            raise ValueError(payload["s"])
+        return {
+            "sort": payload["s"],
+            "after": (value, ObjectId(payload["id"])),
+            "since": datetime.fromisoformat(payload["t"]) if payload.get("t") else None
+        }
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def parse_since(value: str) -> datetime:
+    """
+    Parse a since= value: ISO 8601 or Unix seconds, as naive UTC
+
+    Raises:
+        ValueError: if the value is neither
+    """
+    try:
+        return datetime.fromtimestamp(float(value), timezone.utc).replace(tzinfo=None)
+    except (ValueError, OverflowError, OSError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError("since must be an ISO 8601 timestamp or Unix seconds")
+    # created_at is stored as naive UTC
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_fields(args: Mapping[str, str]) -> Optional[List[str]]:
+    """
+    Read fields= (comma separated) or view=summary|full from request arguments
+
+    Returns:
+        List of COMIC_FIELDS, or None for whole documents
+
+    Raises:
+        ValueError: for an unknown field or view
+    """
+    if args.get('fields'):
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in MongoDBManager.COMIC_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. "
+                             f"Available: {', '.join(MongoDBManager.COMIC_FIELDS)}")
+        return fields
+
+    view = args.get('view', 'full')
+    if view not in MongoDBManager.COMIC_VIEWS:
+        raise ValueError(f"view must be one of: {', '.join(MongoDBManager.COMIC_VIEWS)}")
+    return MongoDBManager.COMIC_VIEWS[view]
+
+
+def parse_pagination(args: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    Read limit, skip, sort, cursor, since and title from request arguments
+
+    limit defaults to COMICS_PAGE_SIZE and is capped at COMICS_MAX_PAGE_SIZE.
+    A cursor carries its own sort order and since value; title (an exact
+    match) is not part of it and is passed along with every page.
+
+    Raises:
+        ValueError: for non-numeric or negative values, an unknown sort,
+            a malformed cursor or a cursor combined with skip
+    """
+    try:
+        limit = int(args.get('limit', Config.COMICS_PAGE_SIZE))
+        skip = int(args.get('skip', 0))
+    except (TypeError, ValueError):
+        raise ValueError("limit and skip must be integers")
+    if limit < 1 or skip < 0:
+        raise ValueError("limit must be positive and skip must not be negative")
+
+    sort = args.get('sort', '-created_at')
+    if sort not in MongoDBManager.COMIC_SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(MongoDBManager.COMIC_SORTS)}")
+
+    since = parse_since(args['since']) if args.get('since') else None
+    after = None
+
+    if args.get('cursor'):
+        if skip:
+            raise ValueError("cursor cannot be combined with skip")
+        position = decode_cursor(args['cursor'])
+        sort, after, since = position["sort"], position["after"], position["since"]
+
+    return {
+        "limit": min(limit, Config.COMICS_MAX_PAGE_SIZE),
+        "skip": skip,
+        "sort": sort,
+        "after": after,
+        "since": since,
+        "title": args.get('title') or None
+    }
+
+
+def paginate(fetch, page: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fetch one page with fetch(limit, skip, sort, after=, since=, title=, fields=) and describe it
+
+    One extra item is requested to tell whether another page exists
+    without counting the collection. next_cursor continues with a keyset
+    range query; latest is the newest created_at seen, for use as since=
+    when polling for new comics.
+    """
+    items: List[Any] = fetch(
+        page["limit"] + 1, page["skip"], page["sort"],
+        after=page["after"], since=page["since"], title=page.get("title"), fields=page.get("fields")
+    )
+    has_more = len(items) > page["limit"]
+    items = items[:page["limit"]]
+
+    created = [item["created_at"] for item in items if isinstance(item.get("created_at"), datetime)]
+    latest = max(created) if created else page["since"]
+
+    return {
+        "items": items,
+        "limit": page["limit"],
+        "skip": page["skip"],
+        "sort": page["sort"],
+        "has_more": has_more,
+        "next_skip": page["skip"] + page["limit"] if has_more and page["after"] is None else None,
+        "next_cursor": encode_cursor(page["sort"], items[-1], page["since"]) if has_more else None,
+        "latest": latest.isoformat() if latest else None
+    }
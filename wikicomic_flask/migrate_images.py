@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Bring images stored by older versions up to date
+
+- Copies image metadata from the Images collection onto the GridFS file
+  documents, which the single-lookup read path relies on
+- Sets comic_id on images that were only linked to their comic by title
+
+Safe to run more than once.
+"""
+
+import logging
+
+from app import create_app
+from app.database import db_manager
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def migrate():
+    """Run the image metadata migration"""
+    create_app()
+    if not db_manager.connected:
+        print("❌ MongoDB is not connected. Check MONGODB_URI.")
+        return False
+
+    print("🔍 Migrating image metadata into GridFS...")
+    result = db_manager.migrate_image_metadata()
+    print(f"✅ {result['updated']} of {result['scanned']} images updated")
+
+    print("🔍 Linking images to their comics by id...")
+    result = db_manager.migrate_image_comic_ids()
+    print(f"✅ {result['updated']} images linked across {result['scanned']} comics")
+    return True
+
+if __name__ == "__main__":
+    migrate()
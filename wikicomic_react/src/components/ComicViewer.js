@@ -34,24 +34,26 @@ const ComicViewer = () => {
     try {
       setLoading(true);
       console.log('ComicViewer: Fetching comic with ID:', id);
-      const response = await axios.get(`${API_BASE_URL}/comics`);
-      console.log('ComicViewer: Response data:', response.data);
-      if (response.data && response.data.comics) {
-        const found = response.data.comics.find(c => c.title === id);
-        console.log('ComicViewer: Found comic:', found);
-        if (found) {
-          setComic(found);
-          setComicStyle(found.comicStyle);
-          setError(null);
-        } else {
-          setError('Comic not found');
-        }
+      // Fetch only this comic: by id, or the newest comic with this title
+      let found = null;
+      if (/^[0-9a-f]{24}$/i.test(id)) {
+        const response = await axios.get(`${API_BASE_URL}/api/comics/${id}`);
+        found = response.data;
       } else {
-        setError('Invalid response format');
+        const response = await axios.get(`${API_BASE_URL}/comics`, { params: { title: id, limit: 1 } });
+        found = response.data?.comics?.[0];
+      }
+      console.log('ComicViewer: Found comic:', found);
+      if (found) {
+        setComic(found);
+        setComicStyle(found.comicStyle);
+        setError(null);
+      } else {
+        setError('Comic not found');
       }
     } catch (err) {
       console.error('ComicViewer: Error fetching comic:', err);
-      setError('Failed to load comic');
+      setError(err.response?.status === 404 ? 'Comic not found' : 'Failed to load comic');
     } finally {
       setLoading(false);
     }
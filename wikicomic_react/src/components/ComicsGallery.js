@@ -8,6 +8,8 @@ const ComicsGallery = () => {
   const [comics, setComics] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const navigate = useNavigate();
   const { currentTheme } = useTheme();
 
@@ -19,10 +21,12 @@ const ComicsGallery = () => {
     try {
       setLoading(true);
       setError(null);
-      const response = await axios.get(`${API_BASE_URL}/comics`);
+      // The gallery only shows title, scene count and a cover image
+      const response = await axios.get(`${API_BASE_URL}/comics`, { params: { view: 'summary' } });
       
       if (response.data && response.data.comics) {
         setComics(response.data.comics);
+        setNextCursor(response.data.next_cursor || null);
       } else {
         console.error('ComicsGallery: Invalid response format. Expected response.data.comics but got:', response.data);
         throw new Error('Invalid response format');
@@ -35,12 +39,34 @@ const ComicsGallery = () => {
     }
   };
 
-  const handleViewComic = (comicTitle) => {
-    navigate(`/comic/${encodeURIComponent(comicTitle)}`);
+  // Fetch the next page from where the last one ended
+  const loadMoreComics = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const response = await axios.get(`${API_BASE_URL}/comics`, { params: { cursor: nextCursor, view: 'summary' } });
+      setComics(prev => [...prev, ...(response.data.comics || [])]);
+      setNextCursor(response.data.next_cursor || null);
+    } catch (err) {
+      console.error('ComicsGallery: Error loading more comics:', err);
+      setError('Failed to fetch comics. Please try again.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Link by id so the viewer fetches exactly this comic
+  const handleViewComic = (comic) => {
+    navigate(`/comic/${encodeURIComponent(comic._id || comic.title)}`);
   };
 
   // Helper function to get the first image URL for a comic
   const getFirstImageUrl = (comic) => {
+    if (comic.cover) {
+      // Cards are small; ask for a resized thumbnail instead of the full PNG
+      return `${getImageUrl(comic.cover)}?w=320`;
+    }
+
     // Try to get from images array first (MongoDB format)
     if (comic.images && comic.images.length > 0) {
       const firstImage = comic.images[0];
@@ -132,7 +158,7 @@ const ComicsGallery = () => {
               >
                 <div
                   className="relative aspect-w-16 aspect-h-9 cursor-pointer group"
-                  onClick={() => handleViewComic(comic.title)}
+                  onClick={() => handleViewComic(comic)}
                 >
                   <img
                     src={getFirstImageUrl(comic)}
@@ -163,6 +189,19 @@ const ComicsGallery = () => {
             ))}
           </div>
         )}
+
+        {nextCursor && (
+          <div className="text-center mt-10">
+            <button
+              onClick={loadMoreComics}
+              disabled={loadingMore}
+              className="px-6 py-3 bg-gradient-to-r from-purple-500 to-pink-500 text-white font-bold rounded-full border-2 border-black transform hover:scale-105 transition-all duration-200 disabled:opacity-50"
+              style={{ boxShadow: '4px 4px 0 rgba(0,0,0,0.8)' }}
+            >
+              {loadingMore ? 'Loading...' : 'Load More Comics'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -21,6 +21,9 @@ import { BarChart, Bar, XAxis, YAxis, Tooltip, ResponsiveContainer, PieChart, Pi
 import QuizComponent from './QuizComponent';
 import { API_BASE_URL } from '../config/routes';
 
+// How often to check the status of a comic generation job
+const JOB_POLL_INTERVAL_MS = 2000;
+
 // Simple debounce function
 const debounce = (func, wait) => {
   let timeout;
@@ -162,6 +165,24 @@ const LandingPage = () => {
     return () => document.removeEventListener('mousedown', handleClickOutside);
   }, [showLanguageMenu]);
 
+  // Poll a comic generation job until it completes or fails
+  const waitForJob = async (statusUrl) => {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+      const res = await fetch(`${API_BASE_URL}${statusUrl}`, {
+        headers: { 'Accept': 'application/json' }
+      });
+      if (!res.ok) {
+        throw new Error(`Server error: ${res.status}`);
+      }
+      const job = await res.json();
+      console.log(`Job ${job.job_id}: ${job.stage} (${job.scenes_completed}/${job.scenes_total} scenes)`);
+      if (job.status === 'completed' || job.status === 'failed') {
+        return job;
+      }
+    }
+  };
+
   // Only keep handleSubmit and fetchSuggestions that use /search and /suggest endpoints
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -207,7 +228,7 @@ const LandingPage = () => {
         throw new Error(`Server error: ${res.status} - ${errorText}`);
       }
       
-      const data = await res.json();
+      let data = await res.json();
       console.log('Comic generation response:', data);
       
       // Check if the backend returned an error message
@@ -216,6 +237,16 @@ const LandingPage = () => {
         return;
       }
       
+      // Generation runs as a background job - poll until it finishes
+      if (data.job_id) {
+        const job = await waitForJob(data.status_url);
+        if (job.status === 'failed') {
+          setError(job.error || 'Failed to generate comic. Please try again.');
+          return;
+        }
+        data = { ...data, ...job.result };
+      }
+      
       setResult(data.result);
       setStoryline(data.storyline);
       setScenes(data.scenes);
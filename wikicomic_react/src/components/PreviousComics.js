@@ -1,12 +1,30 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import ComicFlipbook from './ComicFlipbook';
 import { API_BASE_URL, getImageUrl } from '../config/routes';
 
+// How often to check for comics created since the last load
+const REFRESH_INTERVAL_MS = 60000;
+
 const PreviousComics = () => {
   const [comics, setComics] = useState([]);
   const [selectedComic, setSelectedComic] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
+  const latest = useRef(null);
+
+  // Cards only need a title and a cover; images are fetched when a comic is opened
+  const fetchPage = async (params) => {
+    const query = new URLSearchParams({ view: 'summary', ...params });
+    const res = await fetch(`${API_BASE_URL}/comics?${query}`, { headers: { Accept: 'application/json' } });
+    if (!res.ok) throw new Error('Failed to fetch comics');
+    const data = await res.json();
+    if (data.latest && (!latest.current || data.latest > latest.current)) {
+      latest.current = data.latest;
+    }
+    return data;
+  };
 
   useEffect(() => {
     const fetchComics = async () => {
@@ -14,12 +32,10 @@ const PreviousComics = () => {
       setError('');
       try {
         console.log('PreviousComics: Fetching from:', `${API_BASE_URL}/comics`);
-        const res = await fetch(`${API_BASE_URL}/comics`);
-        console.log('PreviousComics: Response status:', res.status);
-        if (!res.ok) throw new Error('Failed to fetch comics');
-        const data = await res.json();
+        const data = await fetchPage({});
         console.log('PreviousComics: Data received:', data);
         setComics(data.comics || []);
+        setNextCursor(data.next_cursor || null);
       } catch (err) {
         console.error('PreviousComics: Error:', err);
         setError('Failed to load previous comics.');
@@ -28,8 +44,50 @@ const PreviousComics = () => {
       }
     };
     fetchComics();
+
+    // Prepend comics created since the newest one already shown
+    const refresh = setInterval(async () => {
+      if (!latest.current) return;
+      try {
+        const data = await fetchPage({ since: latest.current });
+        if (data.comics && data.comics.length > 0) {
+          setComics(prev => [...data.comics, ...prev]);
+        }
+      } catch (err) {
+        console.error('PreviousComics: Refresh failed:', err);
+      }
+    }, REFRESH_INTERVAL_MS);
+    return () => clearInterval(refresh);
+    // eslint-disable-next-line
   }, []);
 
+  // Fetch the next page from where the last one ended
+  const loadMoreComics = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const data = await fetchPage({ cursor: nextCursor });
+      setComics(prev => [...prev, ...(data.comics || [])]);
+      setNextCursor(data.next_cursor || null);
+    } catch (err) {
+      console.error('PreviousComics: Error loading more comics:', err);
+      setError('Failed to load previous comics.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const openComic = async (comic) => {
+    try {
+      const res = await fetch(`${API_BASE_URL}/api/comics/${comic._id}?fields=title,images`);
+      if (!res.ok) throw new Error('Failed to fetch comic');
+      setSelectedComic(await res.json());
+    } catch (err) {
+      console.error('PreviousComics: Error opening comic:', err);
+      setError('Failed to load comic.');
+    }
+  };
+
   // Convert MongoDB image format to URLs for ComicFlipbook
   const getImageUrls = (comic) => {
     console.log('getImageUrls called with comic:', comic);
@@ -59,24 +117,33 @@ const PreviousComics = () => {
       {!selectedComic ? (
         <div className="grid grid-cols-2 md:grid-cols-4 gap-4">
           {comics.map((comic) => (
-            <div key={comic.title} className="border-2 border-black rounded-lg p-2 cursor-pointer hover:bg-gray-100" onClick={() => setSelectedComic(comic)}>
+            <div key={comic._id} className="border-2 border-black rounded-lg p-2 cursor-pointer hover:bg-gray-100" onClick={() => openComic(comic)}>
               <div className="font-bold mb-2">{comic.title}</div>
-              {comic.images && comic.images[0] && (
+              {comic.cover && (
                 <img
-                  src={getImageUrl(comic.images[0])}
+                  src={`${getImageUrl(comic.cover)}?w=320`}
                   alt={comic.title}
                   className="w-full h-40 object-cover rounded"
                   onError={(e) => handleImageError(e, comic.title)}
                   onLoad={() => console.log(`Image loaded successfully for: ${comic.title}`)}
                 />
               )}
-              {(!comic.images || comic.images.length === 0) && (
+              {!comic.cover && (
                 <div className="w-full h-40 bg-gray-200 flex items-center justify-center rounded">
                   <span className="text-gray-500">No images</span>
                 </div>
               )}
             </div>
           ))}
+          {nextCursor && (
+            <button
+              className="col-span-2 md:col-span-4 px-4 py-2 bg-gray-200 border border-black rounded"
+              onClick={loadMoreComics}
+              disabled={loadingMore}
+            >
+              {loadingMore ? 'Loading...' : 'Load More'}
+            </button>
+          )}
         </div>
       ) : (
         <div>
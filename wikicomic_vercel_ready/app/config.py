@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,6 +13,8 @@ class Config:
     MONGODB_COLLECTION_IMAGES = os.getenv('MONGODB_COLLECTION_IMAGES', 'Images')
     MONGODB_COLLECTION_COMICS = os.getenv('MONGODB_COLLECTION_COMICS', 'Comics')
     MONGODB_COLLECTION_SCENES = os.getenv('MONGODB_COLLECTION_SCENES', 'Scenes')
+    MONGODB_COLLECTION_CACHE = os.getenv('MONGODB_COLLECTION_CACHE', 'Cache')
+    MONGODB_BUCKET_DERIVATIVES = os.getenv('MONGODB_BUCKET_DERIVATIVES', 'derivatives')  # GridFS bucket for resized images
     
     # API Keys
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
@@ -23,4 +26,53 @@ class Config:
     
     # Image Storage Configuration
     MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', 10 * 1024 * 1024))  # 10MB default
-    ALLOWED_IMAGE_TYPES = ['image/png', 'image/jpeg', 'image/jpg', 'image/webp']
\ No newline at end of file
+    ALLOWED_IMAGE_TYPES = ['image/png', 'image/jpeg', 'image/jpg', 'image/webp']
+    IMAGE_STORAGE = os.getenv('IMAGE_STORAGE', 'gridfs').lower()  # Keep gridfs on Vercel: the filesystem is read-only apart from an ephemeral /tmp
+    IMAGE_STORAGE_DIR = os.getenv('IMAGE_STORAGE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'image_store'))
+    
+    # Generated image cache keyed by prompt hash (empty IMAGE_CACHE_DIR disables it)
+    IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'wikicomic', 'image_cache'))
+    IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # 512MB default
+
+    # Read-through disk cache of stored images and derivatives in front of GridFS (empty IMAGE_DISK_CACHE_DIR disables it)
+    IMAGE_DISK_CACHE_DIR = os.getenv('IMAGE_DISK_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'wikicomic', 'image_files'))
+    IMAGE_DISK_CACHE_MAX_BYTES = int(os.getenv('IMAGE_DISK_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # 256MB default; /tmp is small and per instance on Vercel
+
+    # Resized/transcoded image derivatives (?w= and ?format= on /api/images)
+    IMAGE_DERIVATIVE_WIDTHS = [int(w) for w in os.getenv('IMAGE_DERIVATIVE_WIDTHS', '160,320,640,960').split(',') if w.strip()]
+    IMAGE_NEGOTIATED_FORMATS = [f.strip() for f in os.getenv('IMAGE_NEGOTIATED_FORMATS', 'webp').split(',') if f.strip()]  # Chosen from Accept, in order
+    IMAGE_DERIVATIVE_QUALITY = int(os.getenv('IMAGE_DERIVATIVE_QUALITY', 80))
+
+    # In-process query/response cache, split into independently locked stripes
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', 1024))
+    QUERY_CACHE_MAX_BYTES = int(os.getenv('QUERY_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 64MB default, 0 for no byte limit
+    QUERY_CACHE_TTL = int(os.getenv('QUERY_CACHE_TTL', 300))
+    QUERY_CACHE_STRIPES = int(os.getenv('QUERY_CACHE_STRIPES', 16))
+    RESPONSE_CACHE_SHARED = os.getenv('RESPONSE_CACHE_SHARED', 'True').lower() == 'true'  # Share cached responses between serverless instances through the cache collection
+    CACHE_INVALIDATION = os.getenv('CACHE_INVALIDATION', 'request').lower()  # Polled from requests; serverless instances cannot keep a watcher thread alive
+    CACHE_INVALIDATION_POLL_INTERVAL = int(os.getenv('CACHE_INVALIDATION_POLL_INTERVAL', 5))
+
+    # Comic gallery pagination
+    COMICS_PAGE_SIZE = int(os.getenv('COMICS_PAGE_SIZE', 50))
+    COMICS_MAX_PAGE_SIZE = int(os.getenv('COMICS_MAX_PAGE_SIZE', 200))
+
+    # Comic Generation Jobs
+    ASYNC_GENERATION = os.getenv('ASYNC_GENERATION', 'False').lower() == 'true'  # Serverless instances cannot keep background threads alive
+    JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', 2))  # Jobs running at once, on the event loop or the thread pool
+    JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', 20))
+    JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 3600))  # Keep finished jobs for 1 hour
+    JOB_EVENTS_POLL_INTERVAL = int(os.getenv('JOB_EVENTS_POLL_INTERVAL', 1))  # Seconds between reads of a job running in another worker
+
+    # Provider concurrency, shared by all comics in the process
+    GROQ_MAX_CONCURRENCY = int(os.getenv('GROQ_MAX_CONCURRENCY', 8))
+    GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', 3))
+
+    # Story Generation
+    STREAM_SCENES = os.getenv('STREAM_SCENES', 'True').lower() == 'true'  # Start images while scenes are still being written
+    SINGLE_CALL_STORY = os.getenv('SINGLE_CALL_STORY', 'False').lower() == 'true'  # Storyline + scenes in one JSON completion
+    STORY_CACHE_TTL = int(os.getenv('STORY_CACHE_TTL', 7 * 24 * 3600))  # 1 week
+    STORY_CACHE_MAX_ENTRIES = int(os.getenv('STORY_CACHE_MAX_ENTRIES', 1000))
+    WIKI_CACHE_TTL = int(os.getenv('WIKI_CACHE_TTL', 24 * 3600))  # Pages are revalidated by revision id on each hit
+    WIKI_CACHE_MAX_ENTRIES = int(os.getenv('WIKI_CACHE_MAX_ENTRIES', 500))
+    PREVIEW_TTL = int(os.getenv('PREVIEW_TTL', 1800))  # GET /search preview tokens are valid for 30 minutes
+    PREVIEW_MAX_ENTRIES = int(os.getenv('PREVIEW_MAX_ENTRIES', 1000))
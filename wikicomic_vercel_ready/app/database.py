@@ -1,19 +1,24 @@
 import os
 import logging
 import base64
-from datetime import datetime
+import hashlib
+from datetime import datetime, timedelta
+from collections import Counter
 from io import BytesIO
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from pymongo.server_api import ServerApi
 from pymongo.errors import ConnectionFailure, OperationFailure, ServerSelectionTimeoutError
-from gridfs import GridFS
+from gridfs.errors import NoFile
 from PIL import Image
 import json
 from functools import lru_cache
 import time
 
+from .utils.cache import DiskCache, StripedCache, register_cache
+from .utils.storage import DiskCachedImageStore, FileImageStore, GridFSImageStore
+
 logger = logging.getLogger(__name__)
 
 class MongoDBManager:
@@ -21,13 +26,22 @@ class MongoDBManager:
         self.client = None
         self.db = None
         self.fs = None
+        self.derivatives_fs = None
+        self.derivatives_bucket = 'derivatives'
+        self.image_store = None
         self.images_collection = None
         self.comics_collection = None
         self.scenes_collection = None
+        self.cache_collection = None
         self.connected = False
         self._connection_pool = {}
-        self._cache = {}
-        self._cache_ttl = 300  # 5 minutes cache
+        self._cache = StripedCache(max_entries=1024, ttl=300)
+        self._shared_cache = False
+        self._shared_cache_entries = 1024
+        self._cache_writes = Counter()
+        # Whether images without a comic_id may exist (see migrate_image_comic_ids)
+        self._legacy_images = True
+        register_cache("queries", self._cache)
         
         if app is not None:
             self.init_app(app)
@@ -35,6 +49,17 @@ class MongoDBManager:
     def init_app(self, app):
         """Initialize MongoDB connection with Flask app"""
         try:
+            # Size the in-process query/response cache before anything can use it
+            self._cache = StripedCache(
+                max_entries=app.config.get('QUERY_CACHE_MAX_ENTRIES', 1024),
+                ttl=app.config.get('QUERY_CACHE_TTL', 300),
+                max_bytes=app.config.get('QUERY_CACHE_MAX_BYTES', 0),
+                stripes=app.config.get('QUERY_CACHE_STRIPES', 16)
+            )
+            register_cache("queries", self._cache)
+            self._shared_cache = app.config.get('RESPONSE_CACHE_SHARED', False)
+            self._shared_cache_entries = app.config.get('QUERY_CACHE_MAX_ENTRIES', 1024)
+
             # Check if MongoDB URI is configured
             mongodb_uri = app.config.get('MONGODB_URI')
             if not mongodb_uri:
@@ -62,13 +87,34 @@ class MongoDBManager:
             
             # Initialize database and collections
             self.db = self.client[app.config['MONGODB_DB_NAME']]
-            self.fs = GridFS(self.db)
+            self.derivatives_bucket = app.config.get('MONGODB_BUCKET_DERIVATIVES', 'derivatives')
+            gridfs_store = GridFSImageStore(self.db, self.derivatives_bucket)
+            self.fs = gridfs_store.fs
+            self.derivatives_fs = gridfs_store.derivatives_fs
+            remote_store = gridfs_store
+            if app.config.get('IMAGE_DISK_CACHE_DIR'):
+                # Hot images are served from local disk instead of GridFS chunks
+                try:
+                    disk_cache = DiskCache(app.config['IMAGE_DISK_CACHE_DIR'],
+                                           app.config.get('IMAGE_DISK_CACHE_MAX_BYTES', 1024 ** 3))
+                    register_cache("image_files", disk_cache)
+                    remote_store = DiskCachedImageStore(gridfs_store, disk_cache)
+                except OSError as e:
+                    logger.warning(f"Image disk cache disabled: {e}")
+            if app.config.get('IMAGE_STORAGE', 'gridfs') == 'file':
+                # GridFS stays readable for images stored before the switch
+                self.image_store = FileImageStore(app.config['IMAGE_STORAGE_DIR'], fallback=remote_store)
+            else:
+                self.image_store = remote_store
+            logger.info(f"Image storage: {self.image_store.name}")
             
             self.images_collection = self.db[app.config['MONGODB_COLLECTION_IMAGES']]
             self.comics_collection = self.db[app.config['MONGODB_COLLECTION_COMICS']]
             self.scenes_collection = self.db[app.config['MONGODB_COLLECTION_SCENES']]
+            self.cache_collection = self.db[app.config.get('MONGODB_COLLECTION_CACHE', 'Cache')]
             
             # Create indexes for better performance
+            self._check_legacy_images()
             self._create_indexes()
             
             self.connected = True
@@ -91,27 +137,218 @@ class MongoDBManager:
         """Generate cache key"""
         return f"{prefix}:{':'.join(str(arg) for arg in args)}"
     
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """Check if cache entry is still valid"""
-        if cache_key not in self._cache:
-            return False
-        cache_time, _ = self._cache[cache_key]
-        return time.time() - cache_time < self._cache_ttl
+    # Writes to a cache namespace between checks of its max_entries
+    CACHE_EVICT_INTERVAL = 64
+
+    # Seconds a comics collection version is reused for ETags
+    COMICS_VERSION_TTL = 5
+
+    # Namespace of cached responses in the shared cache collection
+    RESPONSE_CACHE_NAMESPACE = "responses"
+
+    def _shared_key(self, cache_key: str) -> str:
+        # Response keys embed query strings and headers; hash them to a bounded _id
+        return hashlib.sha1(cache_key.encode()).hexdigest()
+
+    def _set_cache(self, cache_key: str, data: Any, ttl: Optional[int] = None, tags: Tuple[str, ...] = ()):
+        """
+        Set cache entry, expiring after ttl seconds (QUERY_CACHE_TTL by default)
+
+        With RESPONSE_CACHE_SHARED the entry is also written to the cache
+        collection, where other processes and serverless instances find it.
+        """
+        self._cache.set(cache_key, data, ttl, tags=tags)
+        if self._shared_cache and self.connected:
+            ttl = self._cache.ttl if ttl is None else ttl
+            self.cache_set(
+                self.RESPONSE_CACHE_NAMESPACE, self._shared_key(cache_key),
+                {"data": data, "expires": time.time() + ttl}, ttl,
+                max_entries=self._shared_cache_entries, tags=list(tags)
+            )
     
-    def _set_cache(self, cache_key: str, data: Any):
-        """Set cache entry"""
-        self._cache[cache_key] = (time.time(), data)
-        # Clean old cache entries
-        current_time = time.time()
-        self._cache = {k: v for k, v in self._cache.items() 
-                      if current_time - v[0] < self._cache_ttl}
+    def _get_cache(self, cache_key: str, tags: Tuple[str, ...] = ()) -> Optional[Any]:
+        """Get cache entry if valid, from this process or the shared cache collection"""
+        data = self._cache.get(cache_key, tags=tags)
+        if data is not None or not (self._shared_cache and self.connected):
+            return data
+
+        entry = self.cache_get(self.RESPONSE_CACHE_NAMESPACE, self._shared_key(cache_key))
+        if entry is None:
+            return None
+        remaining = entry["expires"] - time.time()
+        if remaining <= 0:
+            return None
+        # Keep it locally for no longer than the shared entry lives
+        self._cache.set(cache_key, entry["data"], remaining, tags=tags)
+        return entry["data"]
+
+    def invalidate_cache(self, *tags: str, shared: bool = True):
+        """
+        Drop cached entries stored under any of the tags
+
+        "comics" covers comic lists and "comic:<id>" a single comic;
+        "image:<id>" tells other processes to purge a deleted image's
+        local files.
+        Unless shared is False, shared entries are deleted from the cache
+        collection as well and the invalidation is appended to the log
+        other processes poll (see invalidation_events).
+        """
+        self._cache.invalidate(*tags)
+        if not shared or not self.connected or self.cache_collection is None:
+            return
+
+        try:
+            if self._shared_cache:
+                self.cache_collection.delete_many({
+                    "namespace": self.RESPONSE_CACHE_NAMESPACE,
+                    "tags": {"$in": list(tags)}
+                })
+            self.cache_collection.update_one(
+                {"_id": self.INVALIDATION_LOG_ID},
+                {
+                    "$inc": {"seq": 1},
+                    "$push": {"events": {"$each": [list(tags)], "$slice": -self.INVALIDATION_LOG_SIZE}}
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Shared cache invalidation failed for {tags}: {e}")
+
+    def purge_image_files(self, image_ids: List[str]):
+        """Remove local copies of deleted images (disk cache or file store) in this process"""
+        if self.image_store is not None:
+            self.image_store.purge([ObjectId(image_id) for image_id in image_ids if ObjectId.is_valid(image_id)])
+
+    def clear_cache(self):
+        """Drop every entry of this process's query/response cache"""
+        self._cache.clear()
+
+    # Capped log of recent invalidations in the cache collection, for processes
+    # that cannot use change streams
+    INVALIDATION_LOG_ID = "invalidations"
+    INVALIDATION_LOG_SIZE = 100
+
+    def invalidation_events(self, after: Optional[int]) -> Tuple[Optional[int], Optional[List[str]]]:
+        """
+        Tags invalidated since sequence number after
+
+        Args:
+            after: Sequence number seen by the previous call, or None on the first
+
+        Returns:
+            Tuple of (current sequence number, tags), where tags is None
+            when events were missed and everything should be dropped
+        """
+        if not self._check_connection() or self.cache_collection is None:
+            return after, []
+
+        doc = self.cache_collection.find_one({"_id": self.INVALIDATION_LOG_ID}, {"seq": 1, "events": 1})
+        seq = doc["seq"] if doc else 0
+        if after is None or seq == after:
+            return seq, []
+
+        missed = seq - after
+        events = doc.get("events", [])
+        if missed < 0 or missed > len(events):
+            # The log was trimmed (or reset) past what this process saw
+            return seq, None
+        return seq, sorted({tag for event in events[-missed:] for tag in event})
     
-    def _get_cache(self, cache_key: str) -> Optional[Any]:
-        """Get cache entry if valid"""
-        if self._is_cache_valid(cache_key):
-            return self._cache[cache_key][1]
-        return None
+    def cache_get(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        Get a value from the persistent cache collection
+        
+        Args:
+            namespace: Cache namespace
+            key: Key within the namespace
+            
+        Returns:
+            Cached value, or None if missing or expired
+        """
+        if not self._check_connection() or self.cache_collection is None:
+            return None
+            
+        try:
+            now = datetime.utcnow()
+            doc = self.cache_collection.find_one_and_update(
+                {"_id": f"{namespace}:{key}", "expires_at": {"$gt": now}},
+                {"$set": {"last_used": now}},
+                projection={"value": 1}
+            )
+            return doc["value"] if doc else None
+        except Exception as e:
+            logger.warning(f"Cache read failed for {namespace}:{key}: {e}")
+            return None
     
+    def cache_set(self, namespace: str, key: str, value: Any, ttl: int, 
+                  max_entries: Optional[int] = None, tags: Optional[List[str]] = None):
+        """
+        Store a value in the persistent cache collection
+        
+        Args:
+            namespace: Cache namespace
+            key: Key within the namespace
+            value: BSON-serializable value
+            ttl: Seconds until the entry expires
+            max_entries: Evict least recently used entries above this count,
+                checked every CACHE_EVICT_INTERVAL writes to the namespace;
+                the TTL index removes expired entries in between
+            tags: Labels the entry can be deleted by (see invalidate_cache)
+        """
+        if not self._check_connection() or self.cache_collection is None:
+            return
+            
+        try:
+            now = datetime.utcnow()
+            self.cache_collection.replace_one(
+                {"_id": f"{namespace}:{key}"},
+                {
+                    "namespace": namespace,
+                    "key": key,
+                    "value": value,
+                    "expires_at": now + timedelta(seconds=ttl),
+                    "last_used": now,
+                    **({"tags": tags} if tags else {})
+                },
+                upsert=True
+            )
+            if max_entries:
+                self._cache_writes[namespace] += 1
+                if self._cache_writes[namespace] % self.CACHE_EVICT_INTERVAL == 0:
+                    self._evict_cache_entries(namespace, max_entries)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {namespace}:{key}: {e}")
+    
+    def cache_delete(self, namespace: str, key: str):
+        """Remove a value from the persistent cache collection"""
+        if not self._check_connection() or self.cache_collection is None:
+            return
+            
+        try:
+            self.cache_collection.delete_one({"_id": f"{namespace}:{key}"})
+        except Exception as e:
+            logger.warning(f"Cache delete failed for {namespace}:{key}: {e}")
+    
+    def _evict_cache_entries(self, namespace: str, max_entries: int):
+        """Delete the least recently used entries of a namespace above max_entries"""
+        excess = self.cache_collection.count_documents({"namespace": namespace}) - max_entries
+        if excess <= 0:
+            return
+        stale = self.cache_collection.find(
+            {"namespace": namespace}, {"_id": 1}
+        ).sort("last_used", 1).limit(excess)
+        self.cache_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in stale]}})
+    
+    def _check_legacy_images(self):
+        """Note whether any image still lacks a comic_id, enabling the title fallbacks"""
+        try:
+            self._legacy_images = self.images_collection.find_one({"comic_id": None}, {"_id": 1}) is not None
+        except Exception as e:
+            logger.warning(f"Legacy image check failed: {e}")
+            self._legacy_images = True
+        if self._legacy_images:
+            logger.info("Images without comic_id found; run migrate_images.py to link them")
+
     def _create_indexes(self):
         """Create database indexes for better performance"""
         try:
@@ -120,25 +357,45 @@ class MongoDBManager:
                 return
                 
             # Index for images collection
-            self.images_collection.create_index([("comic_title", 1)])
+            self.images_collection.create_index([("comic_id", 1), ("scene_number", 1)])
+            if self._legacy_images:
+                # Only the title fallback for images without comic_id reads by title
+                self.images_collection.create_index([("comic_title", 1), ("scene_number", 1)])
             self.images_collection.create_index([("scene_number", 1)])
             self.images_collection.create_index([("created_at", -1)])
             
             # Index for comics collection
             self.comics_collection.create_index([("title", 1)])
             self.comics_collection.create_index([("created_at", -1)])
+            self.comics_collection.create_index([("created_at", -1), ("_id", -1)])
+            self.comics_collection.create_index([("updated_at", -1)])
+            self.comics_collection.create_index([("title", 1), ("_id", 1)])
             
             # Index for scenes collection
             self.scenes_collection.create_index([("comic_id", 1)])
             self.scenes_collection.create_index([("scene_number", 1)])
             
+            # Index for resized/transcoded image lookups by (image_id, width, format)
+            if self.derivatives_fs is not None:
+                self.db[f"{self.derivatives_bucket}.files"].create_index([
+                    ("metadata.image_id", 1), ("metadata.width", 1), ("metadata.format", 1)
+                ])
+            
+            # Index for cache collection: expired entries are removed by MongoDB,
+            # least recently used ones by _evict_cache_entries
+            if self.cache_collection is not None:
+                self.cache_collection.create_index([("expires_at", 1)], expireAfterSeconds=0)
+                self.cache_collection.create_index([("namespace", 1), ("last_used", 1)])
+                self.cache_collection.create_index([("namespace", 1), ("tags", 1)])
+            
         except Exception as e:
             logger.warning(f"Index creation failed: {e}")
     
     def store_image(self, image_data: bytes, comic_title: str, scene_number: int, 
-                   scene_text: str, metadata: Dict[str, Any] = None) -> str:
+                   scene_text: str, metadata: Dict[str, Any] = None,
+                   comic_id: Optional[str] = None) -> str:
         """
-        Store image in GridFS with metadata
+        Store image bytes in the image store and its document in the images collection
         
         Args:
             image_data: Raw image bytes
@@ -146,6 +403,8 @@ class MongoDBManager:
             scene_number: Scene number
             scene_text: Text/description for the scene
             metadata: Additional metadata
+            comic_id: ObjectId of the comic the image belongs to (reserve it
+                with new_comic_id before the comic itself is stored)
             
         Returns:
             ObjectId of the stored image
@@ -154,12 +413,14 @@ class MongoDBManager:
             raise ConnectionError("MongoDB is not connected")
             
         # Check if collections are properly initialized
-        if self.fs is None or self.images_collection is None:
+        if self.image_store is None or self.images_collection is None:
             raise ConnectionError("Database collections not initialized")
             
         try:
             # Prepare metadata
+            comic_oid = ObjectId(comic_id) if comic_id else None
             file_metadata = {
+                "comic_id": comic_oid,
                 "comic_title": comic_title,
                 "scene_number": scene_number,
                 "scene_text": scene_text,
@@ -168,20 +429,24 @@ class MongoDBManager:
                 **(metadata or {})
             }
             
-            # Store in GridFS
-            file_id = self.fs.put(
+            file_id = ObjectId()
+            self.image_store.put_image(
+                file_id,
                 image_data,
                 filename=f"{comic_title}_scene_{scene_number}.png",
+                content_type="image/png",
                 metadata=file_metadata
             )
             
             # Store reference in images collection
             image_doc = {
                 "_id": file_id,
+                "comic_id": comic_oid,
                 "comic_title": comic_title,
                 "scene_number": scene_number,
                 "scene_text": scene_text,
                 "file_size": len(image_data),
+                "storage": self.image_store.name,
                 "created_at": datetime.utcnow(),
                 "metadata": metadata or {}
             }
@@ -196,7 +461,7 @@ class MongoDBManager:
     
     def get_image(self, image_id: str) -> Optional[Dict[str, Any]]:
         """
-        Retrieve image from GridFS
+        Retrieve image bytes and metadata
         
         Args:
             image_id: ObjectId of the image
@@ -209,31 +474,205 @@ class MongoDBManager:
             return None
             
         # Check if collections are properly initialized
-        if self.fs is None or self.images_collection is None:
+        if self.image_store is None:
             logger.error("❌ Cannot retrieve image: Database collections not initialized")
             return None
             
         try:
-            # Get file from GridFS
-            grid_out = self.fs.get(ObjectId(image_id))
-            
-            # Get metadata from images collection
-            image_doc = self.images_collection.find_one({"_id": ObjectId(image_id)})
-            
-            if not image_doc:
+            # GridFS keeps the scene metadata on the file document, so this is
+            # one fs.files lookup (see migrate_image_metadata for older images)
+            image = self.image_store.open_image(ObjectId(image_id))
+            if image is None:
                 return None
+            metadata = image.metadata or {}
+            if "scene_number" not in metadata and self.images_collection is not None:
+                # Stores without per-file metadata: read it from the image document
+                doc = self.images_collection.find_one({"_id": ObjectId(image_id)}, {"_id": 0, "metadata": 0}) or {}
+                metadata = {**doc, **metadata}
             
-            return {
-                "image_data": grid_out.read(),
-                "metadata": image_doc,
-                "content_type": grid_out.content_type
-            }
+            try:
+                return {
+                    "image_data": image.read(),
+                    "metadata": {
+                        "_id": ObjectId(image_id),
+                        "file_size": image.length,
+                        **metadata
+                    },
+                    "content_type": image.content_type or metadata.get("content_type", "image/png")
+                }
+            finally:
+                image.close()
             
+        except NoFile:
+            return None
         except Exception as e:
             logger.error(f"❌ Failed to retrieve image {image_id}: {e}")
             return None
     
-    def store_comic(self, title: str, scenes: List[Dict], style: str = "Manga") -> str:
+    def migrate_image_metadata(self, batch_size: int = 500) -> Dict[str, int]:
+        """
+        Copy image metadata from the images collection onto the GridFS file documents
+
+        Images stored before the read path switched to fs.files may lack
+        contentType or scene fields there. Safe to run repeatedly.
+
+        Returns:
+            Dictionary with the number of images scanned and files updated
+        """
+        if not self._check_connection():
+            raise ConnectionError("MongoDB is not connected")
+        if self.images_collection is None or self.db is None:
+            raise ConnectionError("Database collections not initialized")
+
+        files_collection = self.db["fs.files"]
+        scanned = updated = 0
+        batch = []
+
+        def flush():
+            nonlocal updated
+            if batch:
+                updated += files_collection.bulk_write(batch, ordered=False).modified_count
+                batch.clear()
+
+        for image_doc in self.images_collection.find():
+            scanned += 1
+            extra = image_doc.get("metadata") or {}
+            fields = {
+                "contentType": extra.get("content_type", "image/png"),
+                "metadata.comic_title": image_doc.get("comic_title"),
+                "metadata.scene_number": image_doc.get("scene_number"),
+                "metadata.scene_text": image_doc.get("scene_text"),
+                "metadata.content_type": extra.get("content_type", "image/png"),
+                "metadata.created_at": image_doc.get("created_at")
+            }
+            for key, value in extra.items():
+                fields.setdefault(f"metadata.{key}", value)
+            batch.append(UpdateOne({"_id": image_doc["_id"]}, {"$set": fields}))
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+        logger.info(f"✅ Image metadata migration: {updated} of {scanned} files updated")
+        return {"scanned": scanned, "updated": updated}
+
+    def migrate_image_comic_ids(self) -> Dict[str, int]:
+        """
+        Set comic_id on images stored before images were keyed by comic
+
+        Each comic document lists its scenes' image ids, which identifies
+        its images exactly even when several comics share a title. Safe to
+        run repeatedly.
+
+        Returns:
+            Dictionary with the number of comics scanned and images updated
+        """
+        if not self._check_connection():
+            raise ConnectionError("MongoDB is not connected")
+        if self.images_collection is None or self.comics_collection is None or self.db is None:
+            raise ConnectionError("Database collections not initialized")
+
+        scanned = updated = 0
+        for comic in self.comics_collection.find({}, {"scenes.image_id": 1}):
+            scanned += 1
+            image_ids = [
+                ObjectId(scene["image_id"]) for scene in comic.get("scenes") or []
+                if isinstance(scene, dict) and ObjectId.is_valid(scene.get("image_id", ""))
+            ]
+            if not image_ids:
+                continue
+            missing = {"_id": {"$in": image_ids}, "comic_id": None}
+            updated += self.images_collection.update_many(
+                missing, {"$set": {"comic_id": comic["_id"]}}
+            ).modified_count
+            self.db["fs.files"].update_many(
+                {"_id": {"$in": image_ids}, "metadata.comic_id": None},
+                {"$set": {"metadata.comic_id": comic["_id"]}}
+            )
+
+        logger.info(f"✅ Image comic id migration: {updated} images updated across {scanned} comics")
+        self._check_legacy_images()
+        return {"scanned": scanned, "updated": updated}
+
+    def open_image(self, image_id: str):
+        """
+        Open an image for streaming
+
+        Returns:
+            Seekable file object with length, content_type and metadata
+            (a GridOut when stored in GridFS; read it in chunks), or None
+            if not found
+        """
+        if not self._check_connection():
+            logger.error("❌ Cannot retrieve image: MongoDB is not connected")
+            return None
+
+        if self.image_store is None:
+            logger.error("❌ Cannot retrieve image: Database collections not initialized")
+            return None
+
+        try:
+            return self.image_store.open_image(ObjectId(image_id))
+        except Exception as e:
+            logger.error(f"❌ Failed to open image {image_id}: {e}")
+            return None
+
+    def image_path(self, image_id: str) -> Optional[str]:
+        """Local file holding an image, for zero-copy send_file, or None"""
+        if self.image_store is None:
+            return None
+        return self.image_store.image_path(ObjectId(image_id))
+
+    def derivative_path(self, image_id: str, width: int, fmt: str) -> Optional[str]:
+        """Local file holding a stored derivative, for zero-copy send_file, or None"""
+        if self.image_store is None:
+            return None
+        return self.image_store.derivative_path(ObjectId(image_id), width, fmt)
+
+    def open_derivative(self, image_id: str, width: int, fmt: str):
+        """
+        Open a stored resized/transcoded copy of an image for streaming
+
+        Args:
+            image_id: ObjectId of the original image
+            width: Target width in pixels (0 for the original width)
+            fmt: Image format name, e.g. "webp"
+
+        Returns:
+            File object like open_image, or None if it is not stored yet
+        """
+        if not self._check_connection() or self.image_store is None:
+            return None
+
+        try:
+            return self.image_store.open_derivative(ObjectId(image_id), width, fmt)
+        except Exception as e:
+            logger.error(f"❌ Failed to open derivative of {image_id}: {e}")
+            return None
+
+    def store_derivative(self, image_id: str, width: int, fmt: str,
+                         image_data: bytes, content_type: str) -> bool:
+        """Store a resized/transcoded copy of an image next to the original"""
+        if not self._check_connection() or self.image_store is None:
+            return False
+
+        try:
+            self.image_store.put_derivative(ObjectId(image_id), width, fmt, image_data, content_type)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Failed to store derivative of {image_id}: {e}")
+            return False
+
+    def new_comic_id(self) -> str:
+        """
+        Reserve the id of a comic before storing it
+
+        ObjectIds are generated client-side, so images can be stored under
+        the comic's id while it is still being generated.
+        """
+        return str(ObjectId())
+
+    def store_comic(self, title: str, scenes: List[Dict], style: str = "Manga",
+                    comic_id: Optional[str] = None) -> str:
         """
         Store comic metadata
         
@@ -241,6 +680,7 @@ class MongoDBManager:
             title: Comic title
             scenes: List of scene data
             style: Comic style
+            comic_id: Id reserved with new_comic_id, or None for a new one
             
         Returns:
             ObjectId of the stored comic
@@ -261,8 +701,11 @@ class MongoDBManager:
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }
+            if comic_id:
+                comic_doc["_id"] = ObjectId(comic_id)
             
             result = self.comics_collection.insert_one(comic_doc)
+            self.invalidate_cache("comics")
             logger.info(f"✅ Comic stored successfully: {result.inserted_id}")
             return str(result.inserted_id)
             
@@ -270,8 +713,14 @@ class MongoDBManager:
             logger.error(f"❌ Failed to store comic: {e}")
             raise
     
-    def get_comic(self, comic_id: str) -> Optional[Dict[str, Any]]:
-        """Get comic by ID"""
+    def get_comic(self, comic_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get comic by ID
+
+        Args:
+            comic_id: ObjectId of the comic
+            fields: COMIC_FIELDS to return, or None for the stored document
+        """
         if not self._check_connection():
             logger.error("❌ Cannot retrieve comic: MongoDB is not connected")
             return None
@@ -282,16 +731,141 @@ class MongoDBManager:
             return None
             
         try:
-            comic = self.comics_collection.find_one({"_id": ObjectId(comic_id)})
+            comic = self.comics_collection.find_one(
+                {"_id": ObjectId(comic_id)}, self._comic_projection(fields)
+            )
             if comic:
+                if fields is not None:
+                    self._attach_images([comic], fields)
                 comic["_id"] = str(comic.get("_id", ""))
             return comic
         except Exception as e:
             logger.error(f"❌ Failed to get comic {comic_id}: {e}")
             return None
     
-    def get_all_comics(self) -> List[Dict[str, Any]]:
-        """Get all comics with their scenes and images"""
+    # Fields that can be requested with fields=; images (every scene image)
+    # and cover (the first one) are joined from the images collection
+    COMIC_FIELDS = ("title", "style", "scene_count", "created_at", "updated_at",
+                    "scenes", "images", "cover")
+    COMIC_VIEWS = {
+        "summary": ["title", "style", "scene_count", "created_at", "cover"],
+        "full": None
+    }
+
+    def _comic_projection(self, fields: Optional[List[str]],
+                          sort: Optional[str] = None) -> Optional[Dict[str, int]]:
+        """MongoDB projection for the requested fields (None returns whole documents)"""
+        if fields is None:
+            return None
+        # title is needed to join images, created_at and the sort key for paging
+        projection = {"title": 1, "created_at": 1}
+        if sort:
+            projection[sort.lstrip('-')] = 1
+        for field in fields:
+            if field not in ("images", "cover"):
+                projection[field] = 1
+        return projection
+
+    def _attach_images(self, comics: List[Dict[str, Any]], fields: Optional[List[str]]):
+        """Add images and/or cover to comics with one query for the whole list"""
+        want_images = fields is None or "images" in fields
+        want_cover = fields is not None and "cover" in fields
+        if not comics or not (want_images or want_cover):
+            return
+
+        images_by_id = self._group_images(
+            {"comic_id": {"$in": [ObjectId(comic["_id"]) for comic in comics]}}, "comic_id", want_images
+        )
+        images_by_title = {}
+        if self._legacy_images:
+            # Images stored before they were keyed by comic_id are matched by
+            # title, for comics with no keyed images, until
+            # migrate_image_comic_ids has linked them
+            titles = list({
+                comic.get("title", "") for comic in comics
+                if ObjectId(comic["_id"]) not in images_by_id
+            })
+            if titles:
+                images_by_title = self._group_images(
+                    {"comic_id": None, "comic_title": {"$in": titles}}, "comic_title", want_images
+                )
+
+        for comic in comics:
+            comic_images = (images_by_id.get(ObjectId(comic["_id"]))
+                            or images_by_title.get(comic.get("title", ""), []))
+            if want_images:
+                comic["images"] = comic_images
+            if want_cover:
+                comic["cover"] = comic_images[0] if comic_images else None
+
+    def _group_images(self, match: Dict[str, Any], key: str, want_images: bool) -> Dict[Any, List[Dict[str, Any]]]:
+        """Images matching match grouped by key, all of them or only the first of each group"""
+        if want_images:
+            images = self.images_collection.find(
+                match,
+                {key: 1, "scene_number": 1, "scene_text": 1}
+            ).sort("scene_number", 1)
+        else:
+            # First image per group, read from the (key, scene_number) index
+            images = self.images_collection.aggregate([
+                {"$match": match},
+                {"$sort": {key: 1, "scene_number": 1}},
+                {"$group": {
+                    "_id": f"${key}",
+                    "image_id": {"$first": "$_id"},
+                    "scene_number": {"$first": "$scene_number"}
+                }},
+                {"$project": {
+                    "_id": "$image_id",
+                    key: "$_id",
+                    "scene_number": 1
+                }}
+            ])
+
+        grouped = {}
+        for img in images:
+            grouped.setdefault(img.get(key), []).append({
+                "id": str(img.get("_id", "")),
+                "url": f"/api/images/{img.get('_id', '')}",
+                "scene_number": img.get("scene_number", 0),
+                "scene_text": img.get("scene_text", "")
+            })
+        return grouped
+
+    # Sort keys accepted by get_all_comics, mapped to MongoDB sort specs
+    COMIC_SORTS = {
+        "-created_at": [("created_at", -1), ("_id", -1)],
+        "created_at": [("created_at", 1), ("_id", 1)],
+        "title": [("title", 1), ("_id", 1)],
+        "-title": [("title", -1), ("_id", -1)]
+    }
+
+    def get_all_comics(self, limit: Optional[int] = None, skip: int = 0,
+                       sort: str = "-created_at", after: Optional[Tuple[Any, ObjectId]] = None,
+                       since: Optional[datetime] = None, title: Optional[str] = None,
+                       fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Get a page of comics with their images
+
+        Images for the whole page are loaded with one $in query, so the
+        cost does not grow with the number of comics on the page.
+
+        Args:
+            limit: Maximum number of comics to return (None for all)
+            skip: Number of comics to skip
+            sort: One of COMIC_SORTS
+            after: (sort value, _id) of the last comic of the previous page;
+                continues from there with an index range instead of skipping
+            since: Only return comics created after this time
+            title: Only return comics with exactly this title
+            fields: COMIC_FIELDS to return, or None for whole documents with images
+
+        Raises:
+            ValueError: for an unknown sort key
+        """
+        if sort not in self.COMIC_SORTS:
+            raise ValueError(f"Unsupported sort: {sort}")
+
         if not self._check_connection():
             logger.error("❌ Cannot retrieve comics: MongoDB is not connected")
             return []
@@ -302,36 +876,28 @@ class MongoDBManager:
             return []
             
         try:
-            comics = []
-            
-            # Count total comics in collection
-            total_comics = self.comics_collection.count_documents({})
-            
-            for comic in self.comics_collection.find().sort("created_at", -1):
-                # Ensure comic is not None and has required fields
-                if not comic:
-                    continue
-                    
-                comic_id = str(comic.get("_id", ""))
-                comic_title = comic.get("title", "")
-                
-                # Get images for this comic
-                images = self.images_collection.find({"comic_title": comic_title}).sort("scene_number", 1)
-                
-                # Convert images to list with proper URLs
-                image_list = []
-                for img in images:
-                    if img:  # Ensure img is not None
-                        image_list.append({
-                            "id": str(img.get("_id", "")),
-                            "url": f"/api/images/{img.get('_id', '')}",
-                            "scene_number": img.get("scene_number", 0),
-                            "scene_text": img.get("scene_text", "")
-                        })
-                
-                comic["images"] = image_list
-                comic["_id"] = comic_id
-                comics.append(comic)
+            query = {}
+            if since is not None:
+                query["created_at"] = {"$gt": since}
+            if title is not None:
+                query["title"] = title
+            if after is not None:
+                query = {"$and": [query, self._keyset_filter(sort, *after)]} if query else self._keyset_filter(sort, *after)
+
+            cursor = self.comics_collection.find(
+                query, self._comic_projection(fields, sort)
+            ).sort(self.COMIC_SORTS[sort]).skip(skip)
+            if limit is not None:
+                cursor = cursor.limit(limit)
+            comics = [comic for comic in cursor if comic]
+            if not comics:
+                return []
+
+            # Get images for every comic on the page in a single query
+            self._attach_images(comics, fields)
+
+            for comic in comics:
+                comic["_id"] = str(comic.get("_id", ""))
             
             return comics
             
@@ -339,6 +905,43 @@ class MongoDBManager:
             logger.error(f"Failed to get all comics: {e}")
             return []
     
+    def _keyset_filter(self, sort: str, value: Any, last_id: ObjectId) -> Dict[str, Any]:
+        """Filter for comics after (value, last_id) in the given sort order"""
+        (field, direction), _ = self.COMIC_SORTS[sort]
+        op = "$lt" if direction < 0 else "$gt"
+        return {"$or": [
+            {field: {op: value}},
+            {field: value, "_id": {op: last_id}}
+        ]}
+
+    def get_comics_version(self) -> Optional[Tuple[int, Optional[datetime]]]:
+        """
+        Cheap version of the comics collection for ETags
+
+        Returns:
+            Tuple of (estimated document count, newest updated_at), or None
+            if the database is unavailable
+        """
+        # Kept in this process only, briefly, under the "comics" tag that
+        # every comic write and the cache invalidator bump
+        version = self._cache.get("comics_version", tags=("comics",))
+        if version is not None:
+            return version
+        if not self._check_connection() or self.comics_collection is None:
+            return None
+
+        try:
+            count = self.comics_collection.estimated_document_count()
+            newest = self.comics_collection.find_one(
+                {}, {"updated_at": 1, "_id": 0}, sort=[("updated_at", -1)]
+            )
+            version = (count, newest.get("updated_at") if newest else None)
+            self._cache.set("comics_version", version, self.COMICS_VERSION_TTL, tags=("comics",))
+            return version
+        except Exception as e:
+            logger.error(f"❌ Failed to get comics version: {e}")
+            return None
+
     def get_comic_by_title(self, title: str) -> Optional[Dict[str, Any]]:
         """Get comic by title"""
         if not self._check_connection():
@@ -360,44 +963,103 @@ class MongoDBManager:
             logger.error(f"❌ Failed to get comic by title {title}: {e}")
             return None
     
+    def _supports_transactions(self) -> bool:
+        """Multi-document transactions need a replica set or sharded cluster"""
+        try:
+            return self.client.topology_description.topology_type_name in (
+                "ReplicaSetWithPrimary", "Sharded", "LoadBalanced"
+            )
+        except Exception:
+            return False
+
+    def _delete_image_files(self, image_ids: List[ObjectId], session=None):
+        """Delete the stored bytes and derivatives of images inside a transaction"""
+        self.image_store.delete(image_ids, session=session)
+
+    def _run_transaction(self, callback):
+        """Run callback(session) in a transaction when supported, else callback()"""
+        if self._supports_transactions():
+            with self.client.start_session() as session:
+                return session.with_transaction(callback)
+        return callback()
+
+    def delete_images(self, image_ids: List[str]) -> int:
+        """
+        Delete images that belong to no stored comic, e.g. after a failed generation
+
+        Returns:
+            Number of image documents deleted
+        """
+        if not self._check_connection() or self.images_collection is None or self.image_store is None:
+            return 0
+
+        ids = [ObjectId(image_id) for image_id in image_ids if ObjectId.is_valid(image_id)]
+        if not ids:
+            return 0
+
+        def delete_all(session=None):
+            self._delete_image_files(ids, session=session)
+            return self.images_collection.delete_many({"_id": {"$in": ids}}, session=session)
+
+        try:
+            deleted = self._run_transaction(delete_all).deleted_count
+            self.image_store.purge(ids)
+            # Other processes drop their disk-cached copies (see CacheInvalidator)
+            self.invalidate_cache(*(f"image:{image_id}" for image_id in ids))
+            return deleted
+        except Exception as e:
+            logger.error(f"❌ Failed to delete images: {e}")
+            return 0
+
     def delete_comic(self, comic_id: str) -> bool:
-        """Delete comic and all associated images"""
+        """
+        Delete comic and all associated images
+
+        Files, chunks and derivatives are removed with one delete_many per
+        collection, so the number of round trips does not depend on the
+        number of scenes. The deletes run in a transaction when the
+        deployment supports it.
+        """
         if not self._check_connection():
             logger.error("❌ Cannot delete comic: MongoDB is not connected")
             return False
             
         # Check if collections are properly initialized
-        if self.comics_collection is None or self.images_collection is None or self.fs is None:
+        if self.comics_collection is None or self.images_collection is None or self.image_store is None:
             logger.error("❌ Cannot delete comic: Database collections not initialized")
             return False
             
         try:
             # Get comic to find associated images
-            comic = self.get_comic(comic_id)
+            comic = self.comics_collection.find_one({"_id": ObjectId(comic_id)}, {"scenes.image_id": 1})
             if not comic:
                 return False
             
-            comic_title = comic.get("title", "")
-            if not comic_title:
-                logger.error(f"❌ Comic {comic_id} has no title")
-                return False
-            
-            # Delete all images for this comic
-            images = self.images_collection.find({"comic_title": comic_title})
-            for img in images:
-                if img and img.get("_id"):
-                    try:
-                        self.fs.delete(img["_id"])
-                    except:
-                        pass  # Image might already be deleted
-            
-            # Delete image documents
-            self.images_collection.delete_many({"comic_title": comic_title})
-            
-            # Delete comic document
-            result = self.comics_collection.delete_one({"_id": ObjectId(comic_id)})
+            # Collect ids up front; everything below is one delete per collection
+            match = {"comic_id": ObjectId(comic_id)}
+            if self._legacy_images:
+                # Images stored before comic_id are found by the ids in its scenes
+                scene_image_ids = [
+                    ObjectId(scene["image_id"]) for scene in comic.get("scenes") or []
+                    if isinstance(scene, dict) and ObjectId.is_valid(scene.get("image_id", ""))
+                ]
+                if scene_image_ids:
+                    match = {"$or": [match, {"_id": {"$in": scene_image_ids}, "comic_id": None}]}
+            image_ids = [img["_id"] for img in self.images_collection.find(match, {"_id": 1})]
+
+            def delete_all(session=None):
+                self._delete_image_files(image_ids, session=session)
+                # Delete image documents
+                if image_ids:
+                    self.images_collection.delete_many({"_id": {"$in": image_ids}}, session=session)
+                # Delete comic document
+                return self.comics_collection.delete_one({"_id": ObjectId(comic_id)}, session=session)
+
+            result = self._run_transaction(delete_all)
+            self.image_store.purge(image_ids)
+            self.invalidate_cache("comics", f"comic:{comic_id}", *(f"image:{image_id}" for image_id in image_ids))
             
-            logger.info(f"✅ Comic deleted successfully: {comic_id}")
+            logger.info(f"✅ Comic deleted successfully: {comic_id} ({len(image_ids)} images)")
             return result.deleted_count > 0
             
         except Exception as e:
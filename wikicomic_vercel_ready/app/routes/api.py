@@ -1,7 +1,14 @@
-from flask import Blueprint, send_file, jsonify, request, current_app, Response
+from flask import Blueprint, send_file, jsonify, request, current_app, Response, g
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 from io import BytesIO
 from bson import ObjectId
 from ..database import db_manager
+from ..utils.jobs import job_manager
+from ..utils.cache import get_cache_stats
+from ..utils.invalidation import cache_invalidator
+from ..utils.pagination import parse_pagination, parse_fields, paginate
+from ..utils.derivatives import DERIVATIVE_FORMATS, negotiate_format, snap_width, make_derivative
+import hashlib
 import logging
 import time
 from functools import wraps
@@ -9,64 +16,155 @@ from functools import wraps
 logger = logging.getLogger(__name__)
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
-def cache_response(ttl=300):
-    """Decorator to cache API responses"""
+# Headers that describe one particular response and are not replayed from the cache
+_UNCACHED_HEADERS = {'set-cookie', 'date', 'content-length'}
+
+def cache_response(ttl=300, tags=()):
+    """
+    Decorator caching serialized 200 responses in the query cache
+
+    Entries hold the status, headers and body bytes, so a hit builds a
+    fresh Response and can be replayed any number of times. Streamed
+    responses are never cached. Keys include the view arguments, query
+    string, Accept header and the ETag from weak_etag. tags are formatted
+    with the view arguments (e.g. "comic:{comic_id}") and let
+    db_manager.invalidate_cache drop entries when comics change.
+    """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Simple in-memory cache (for Vercel serverless, this is per-instance)
-            cache_key = f"{f.__name__}:{str(args)}:{str(kwargs)}"
+            # Keyed by the data version when weak_etag computed one, so
+            # a new version is never served from a stale entry
+            cache_key = (f"{f.__name__}:{str(args)}:{str(kwargs)}:{request.query_string.decode()}:"
+                         f"{request.headers.get('Accept', '')}:{g.get('etag', '')}")
+            cache_tags = tuple(tag.format(**kwargs) for tag in tags)
             
             # Check cache
-            cached_data = db_manager._get_cache(cache_key)
-            if cached_data:
-                return cached_data
+            cached = db_manager._get_cache(cache_key, tags=cache_tags)
+            if cached is not None:
+                status, headers, body = cached
+                # Entries read back from the shared cache hold lists rather than tuples
+                response = Response(body, status=status, headers=[tuple(header) for header in headers])
+                response.headers['X-Cache'] = 'HIT'
+                return response
             
             # Execute function
-            result = f(*args, **kwargs)
+            response = current_app.make_response(f(*args, **kwargs))
             
             # Cache result
-            db_manager._set_cache(cache_key, result)
+            if response.status_code == 200 and not response.is_streamed and not response.direct_passthrough:
+                headers = [(name, value) for name, value in response.headers.items()
+                           if name.lower() not in _UNCACHED_HEADERS]
+                db_manager._set_cache(cache_key, (response.status_code, headers, response.get_data()),
+                                      ttl, tags=cache_tags)
+            response.headers['X-Cache'] = 'MISS'
             
-            return result
+            return response
+        return decorated_function
+    return decorator
+
+def _comics_etag():
+    """Weak ETag from the comics collection version and this request's options"""
+    version = db_manager.get_comics_version()
+    if version is None:
+        return None
+    count, newest = version
+    stamp = int(newest.timestamp() * 1000) if newest else 0
+    variant = f"{request.path}?{request.query_string.decode()}|{request.headers.get('Accept', '')}|{bool(request.headers.get('Origin'))}"
+    return f"{count}-{stamp}-{hashlib.sha1(variant.encode()).hexdigest()[:12]}"
+
+def weak_etag(etag_fn=_comics_etag):
+    """
+    Decorator answering If-None-Match with 304 from a cheap version check
+
+    The view only runs when the version changed. The ETag is exposed to
+    cache_response through flask.g so cached bodies follow the version.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = etag_fn()
+            if etag and request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag, weak=True)
+                response.headers['Vary'] = 'Accept, Origin'
+                return response
+
+            g.etag = etag
+            response = current_app.make_response(f(*args, **kwargs))
+            if etag and response.status_code == 200:
+                response.set_etag(etag, weak=True)
+                response.headers['Vary'] = 'Accept, Origin'
+            return response
         return decorated_function
     return decorator
 
+# Read size for in-memory derivatives; GridFS files are read one chunk at a time
+STREAM_CHUNK_SIZE = 256 * 1024
+
 @api_bp.route('/images/<image_id>', methods=['GET'])
-@cache_response(ttl=3600)  # Cache images for 1 hour
 def serve_image(image_id):
     """
-    Serve image from MongoDB GridFS with caching
+    Stream an image from the image store
+
+    ?w= resizes to the nearest configured width and ?format= transcodes;
+    without ?format= the format is negotiated from the Accept header.
+    Derivatives are rendered once and stored next to the original.
+
+    Images on local disk (IMAGE_STORAGE=file) are sent with send_file,
+    which uses sendfile where the server supports it. Others are streamed
+    chunk by chunk with Content-Length set. Either way single byte ranges
+    (Range: bytes=...) are answered with 206.
     """
     try:
         # Validate ObjectId
         if not ObjectId.is_valid(image_id):
             return jsonify({"error": "Invalid image ID"}), 400
+
+        try:
+            width = snap_width(request.args.get('w'))
+            fmt = negotiate_format(request.args.get('format'), request.accept_mimetypes)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Get image from database
-        image_data = db_manager.get_image(image_id)
-        
-        if not image_data:
-            return jsonify({"error": "Image not found"}), 404
+        # Images never change once stored, so the ETag alone answers revalidation
+        etag = f'"{image_id}-w{width}.{fmt}"'  # One ETag per variant
+        if request.if_none_match.contains_weak(etag.strip('"')):
+            response = Response(status=304)
+            _set_image_headers(response, image_id, fmt, etag)
+            return response
         
-        # Create BytesIO object for Flask to serve
-        image_bytes = BytesIO(image_data["image_data"])
-        image_bytes.seek(0)
+        original = width == 0 and fmt == "png"
+        path = db_manager.image_path(image_id) if original else db_manager.derivative_path(image_id, width, fmt)
+        if path:
+            # Ranges are only processed for a single satisfiable-looking range;
+            # anything else gets the full body
+            try:
+                response = send_file(path, mimetype=DERIVATIVE_FORMATS[fmt],
+                                     conditional=_single_range() is not None, etag=etag.strip('"'))
+            except RequestedRangeNotSatisfiable as e:
+                return e.get_response()
+            response.headers['Accept-Ranges'] = 'bytes'
+            _set_image_headers(response, image_id, fmt, etag)
+            response.headers['Content-Disposition'] = f'inline; filename="image_{image_id}.{fmt}"'
+            return response
+
+        if original:
+            image_file = db_manager.open_image(image_id)
+        else:
+            image_file = _open_derivative(image_id, width, fmt)
         
-        # Create response with proper headers
-        response = send_file(
-            image_bytes,
-            mimetype=image_data.get("content_type", "image/png"),
-            as_attachment=False,
-            download_name=f"image_{image_id}.png"
+        if image_file is None:
+            return jsonify({"error": "Image not found"}), 404
+
+        metadata = getattr(image_file, "metadata", None) or {}
+        response = _stream_file(
+            image_file,
+            getattr(image_file, "content_type", None) or metadata.get("content_type", "image/png"),
+            etag
         )
-        
-        # Add CORS headers
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-        response.headers['Cache-Control'] = 'public, max-age=31536000'  # Cache for 1 year
-        response.headers['ETag'] = f'"{image_id}"'  # Add ETag for caching
+        _set_image_headers(response, image_id, fmt, etag)
+        response.headers['Content-Disposition'] = f'inline; filename="image_{image_id}.{fmt}"'
         
         return response
         
@@ -74,39 +172,153 @@ def serve_image(image_id):
         logger.error(f"Error serving image {image_id}: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def _set_image_headers(response, image_id, fmt, etag):
+    """CORS and caching headers shared by image and 304 responses"""
+    # Add CORS headers
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Range'
+    response.headers['Access-Control-Expose-Headers'] = 'Content-Length, Content-Range, Accept-Ranges, ETag'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'  # Cache for 1 year
+    response.headers['ETag'] = etag
+    if not request.args.get('format'):
+        response.headers['Vary'] = 'Accept'
+
+def _open_derivative(image_id, width, fmt):
+    """Stored derivative of an image, rendering and storing it on first request"""
+    derivative = db_manager.open_derivative(image_id, width, fmt)
+    if derivative is not None:
+        return derivative
+
+    original = db_manager.open_image(image_id)
+    if original is None:
+        return None
+
+    try:
+        data, content_type = make_derivative(original.read(), width, fmt)
+    finally:
+        original.close()
+    db_manager.store_derivative(image_id, width, fmt, data, content_type)
+    logger.info(f"Created {fmt} derivative of {image_id} at width {width or 'original'}")
+
+    rendered = BytesIO(data)
+    rendered.length = len(data)
+    rendered.metadata = {"content_type": content_type}
+    return rendered
+
+def _single_range():
+    """
+    The request's Range if it names exactly one byte range, else None
+
+    Multi-range and malformed Range headers are ignored and answered with
+    the full body, which RFC 9110 allows.
+    """
+    byte_range = request.range
+    if byte_range is None or byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        return None
+    return byte_range
+
+def _stream_file(image_file, mimetype, etag):
+    """
+    Response streaming a seekable file (GridOut or BytesIO with .length)
+
+    Honors a single Range request, unless If-Range names another version.
+    Only an unsatisfiable single range gets a 416.
+    """
+    length = image_file.length
+    start, end = 0, length
+    status = 200
+
+    byte_range = _single_range()
+    if_range = request.headers.get('If-Range')
+    if byte_range is not None and (not if_range or if_range == etag):
+        span = byte_range.range_for_length(length)
+        if span is None:
+            image_file.close()
+            response = Response(status=416)
+            response.headers['Content-Range'] = f'bytes */{length}'
+            return response
+        start, end = span
+        status = 206
+
+    chunk_size = getattr(image_file, "chunk_size", STREAM_CHUNK_SIZE)
+
+    def generate():
+        try:
+            image_file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = image_file.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            image_file.close()
+
+    response = Response(generate(), status=status, mimetype=mimetype, direct_passthrough=True)
+    response.headers['Content-Length'] = str(end - start)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{end - 1}/{length}'
+    return response
+
 @api_bp.route('/images/<image_id>', methods=['OPTIONS'])
 def serve_image_options(image_id):
     """Handle CORS preflight requests for images"""
     response = Response()
     response.headers['Access-Control-Allow-Origin'] = '*'
     response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Range'
     return response
 
 @api_bp.route('/comics', methods=['GET'])
-@cache_response(ttl=60)  # Cache comics list for 1 minute
+@weak_etag()
+@cache_response(ttl=60, tags=("comics",))  # Cache comics list for 1 minute
 def get_comics():
     """
-    Get all comics with their images (cached)
+    Get a page of comics with their images (cached)
+
+    Query parameters: limit, skip and sort (-created_at, created_at,
+    title or -title); cursor, the next_cursor of a previous page; since,
+    to return only comics created after a timestamp; title, to return only
+    comics with exactly that title. The response includes
+    has_more, next_skip, next_cursor and latest (the since= for polling).
+    fields (comma separated) or view=summary|full select what each comic
+    includes; summary is title, style, scene_count, created_at and cover.
     """
     try:
-        comics = db_manager.get_all_comics()
-        return jsonify({"comics": comics})
+        page = parse_pagination(request.args)
+        page["fields"] = parse_fields(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        result = paginate(db_manager.get_all_comics, page)
+        comics = result.pop("items")
+        return jsonify({"comics": comics, **result})
     except Exception as e:
         logger.error(f"Error getting comics: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 @api_bp.route('/comics/<comic_id>', methods=['GET'])
-@cache_response(ttl=300)  # Cache individual comics for 5 minutes
+@cache_response(ttl=300, tags=("comic:{comic_id}",))  # Cache individual comics for 5 minutes
 def get_comic(comic_id):
     """
     Get specific comic by ID (cached)
+
+    Accepts the same fields= / view= options as /api/comics.
     """
     try:
         if not ObjectId.is_valid(comic_id):
             return jsonify({"error": "Invalid comic ID"}), 400
+
+        try:
+            fields = parse_fields(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        comic = db_manager.get_comic(comic_id)
+        comic = db_manager.get_comic(comic_id, fields=fields)
         if not comic:
             return jsonify({"error": "Comic not found"}), 404
         
@@ -136,6 +348,23 @@ def delete_comic(comic_id):
         logger.error(f"Error deleting comic {comic_id}: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Get status of a background comic generation job, started by any worker
+    """
+    status = job_manager.status(job_id)
+    if not status:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(status)
+
+@api_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """
+    Hit, miss and eviction counters for the application caches
+    """
+    return jsonify({"caches": get_cache_stats(), "invalidation": cache_invalidator.stats()})
+
 @api_bp.route('/health', methods=['GET'])
 def health_check():
     """
@@ -1,30 +1,43 @@
 from flask import Blueprint, render_template, jsonify, request
 from ..database import db_manager
+from ..utils.pagination import parse_pagination, parse_fields, paginate
+from .api import weak_etag
 import logging
 
 logger = logging.getLogger(__name__)
 comics_bp = Blueprint('comics', __name__)
 
 @comics_bp.route('/comics')
+@weak_etag()
 def list_comics():
-    """List all comics"""
+    """List a page of comics (pagination and fields= / view= query parameters)"""
+    is_api = request.headers.get('Accept') == 'application/json' or request.headers.get('Origin')
     try:
-        comics = db_manager.get_all_comics()
+        page = parse_pagination(request.args)
+        page["fields"] = parse_fields(request.args)
+    except ValueError as e:
+        if is_api:
+            return jsonify({"error": str(e)}), 400
+        return render_template('comics.html', comics=[], error=str(e)), 400
+
+    try:
+        result = paginate(db_manager.get_all_comics, page)
+        comics = result.pop("items")
         
         # Always return JSON for API consistency
         # Check if it's an API request (from React frontend)
-        if request.headers.get('Accept') == 'application/json' or request.headers.get('Origin'):
-            return jsonify({"comics": comics})
+        if is_api:
+            return jsonify({"comics": comics, **result})
         
         # Render HTML template for direct browser access
-        return render_template('comics.html', comics=comics)
+        return render_template('comics.html', comics=comics, page=result)
         
     except Exception as e:
         logger.error(f"❌ Error listing comics: {e}")
         error = "Failed to load comics"
         
         # Always return JSON error for API requests
-        if request.headers.get('Accept') == 'application/json' or request.headers.get('Origin'):
+        if is_api:
             return jsonify({"error": error}), 500
         
         return render_template('comics.html', comics=[], error=error)
\ No newline at end of file
@@ -0,0 +1,482 @@
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Named caches whose statistics are reported by /api/cache/stats
+_registry = {}
+
+
+def register_cache(name: str, cache: Any):
+    """Register a cache so its statistics are exposed"""
+    _registry[name] = cache
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Statistics for every registered cache"""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def _sizeof(value: Any) -> int:
+    """Approximate size of a cached value in bytes"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8', 'ignore'))
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_sizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache with LRU eviction and a TTL
+
+    Bounded by max_entries and, when max_bytes is set, by the approximate
+    size of the stored values. get and set are O(1); expired entries are
+    dropped when they are read or reach the LRU end.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: int = 300, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value and mark it most recently used"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, size, value = entry
+            if expires_at < time.time():
+                del self._data[key]
+                self._bytes -= size
+                self.misses += 1
+                self.expirations += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Store a value, evicting the least recently used entries if full"""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        size = _sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._data[key] = (expires_at, size, value)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until within bounds (caller holds the lock)"""
+        now = time.time()
+        while self._data and (len(self._data) > self.max_entries or
+                              (self.max_bytes and self._bytes > self.max_bytes)):
+            _, (expires_at, size, _) = self._data.popitem(last=False)
+            self._bytes -= size
+            if expires_at < now:
+                self.expirations += 1
+            else:
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+            if self.max_bytes:
+                stats["bytes"] = self._bytes
+                stats["max_bytes"] = self.max_bytes
+            return stats
+
+
+class StripedCache:
+    """
+    LRUCache split into independently locked stripes
+
+    Keys are spread over the stripes by hash, so concurrent requests
+    rarely wait on the same lock. The entry and byte limits are divided
+    evenly between stripes, which makes eviction approximately LRU across
+    the whole cache.
+
+    Entries can be stored under tags. invalidate() bumps a tag's
+    generation, which is part of the key, so every entry under the tag
+    stops matching at once and ages out through LRU eviction.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: int = 300, max_bytes: int = 0, stripes: int = 16):
+        # Never more stripes than entries, or each stripe's minimum of one
+        # entry would add up to more than max_entries
+        stripes = max(1, min(stripes, max_entries))
+        self._generations = {}  # tag -> generation
+        self._generations_lock = threading.Lock()
+        self.invalidations = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._stripes = [
+            LRUCache(
+                max_entries=max(1, max_entries // stripes),
+                ttl=ttl,
+                max_bytes=max_bytes // stripes if max_bytes else 0
+            )
+            for _ in range(stripes)
+        ]
+
+    def _stripe(self, key: str) -> LRUCache:
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def _tagged(self, key: str, tags: Iterable[str]) -> str:
+        if not tags:
+            return key
+        return key + "|" + ",".join(f"{tag}@{self._generations.get(tag, 0)}" for tag in sorted(tags))
+
+    def get(self, key: str, default: Any = None, tags: Iterable[str] = ()) -> Any:
+        key = self._tagged(key, tags)
+        return self._stripe(key).get(key, default)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, tags: Iterable[str] = ()):
+        key = self._tagged(key, tags)
+        self._stripe(key).set(key, value, ttl)
+
+    def invalidate(self, *tags: str):
+        """Drop every entry stored under any of the tags"""
+        with self._generations_lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            self.invalidations += 1
+
+    def delete(self, key: str, tags: Iterable[str] = ()):
+        key = self._tagged(key, tags)
+        self._stripe(key).delete(key)
+
+    def clear(self):
+        for stripe in self._stripes:
+            stripe.clear()
+
+    def __len__(self) -> int:
+        return sum(len(stripe) for stripe in self._stripes)
+
+    def stats(self) -> Dict[str, Any]:
+        totals = {"entries": 0, "hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "bytes": 0}
+        for stripe in self._stripes:
+            stats = stripe.stats()
+            for name in totals:
+                totals[name] += stats.get(name, 0)
+        lookups = totals["hits"] + totals["misses"]
+        totals.update({
+            "hit_rate": round(totals["hits"] / lookups, 3) if lookups else 0.0,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "stripes": len(self._stripes),
+            "invalidations": self.invalidations
+        })
+        return totals
+
+
+class PersistentCache:
+    """
+    Two-level cache: an in-process LRU in front of the MongoDB cache collection
+
+    The Mongo level survives restarts and is shared between processes. It is
+    skipped while the database is not connected.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, namespace: str, store: Any, max_entries: int = 1000,
+                 ttl: int = 86400, local_entries: int = 128):
+        self.namespace = namespace
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local = LRUCache(max_entries=local_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        register_cache(namespace, self)
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Any:
+        """Get a cached value, or None on a miss"""
+        value = self.local.get(key, self._MISSING)
+        if value is not self._MISSING:
+            self._count(True)
+            return value
+
+        if self.store.connected:
+            value = self.store.cache_get(self.namespace, key)
+            if value is not None:
+                self.local.set(key, value)
+                self._count(True)
+                return value
+
+        self._count(False)
+        return None
+
+    def set(self, key: str, value: Any):
+        """Store a value in both levels"""
+        self.local.set(key, value)
+        if self.store.connected:
+            self.store.cache_set(self.namespace, key, value, self.ttl, max_entries=self.max_entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+                "local": self.local.stats()
+            }
+
+
+class DiskCache:
+    """
+    Bounded directory of cached blobs with LRU eviction by total bytes
+
+    Keys must be safe file names (hex digests or ObjectIds). Files are
+    written to a temp file and renamed into place, so readers never see a
+    partial file. Recency is tracked through file mtimes, which lets the
+    index be rebuilt from disk on startup.
+
+    Several processes may share the directory. Each keeps its own index,
+    rebuilt from a scan of the directory at most every scan_interval
+    seconds before evicting, so the byte budget applies to the directory
+    as a whole, give or take what was written since the last scan.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, scan_interval: int = 60):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.scan_interval = scan_interval
+        self._index = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self._next_scan = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._rescan()
+
+    def _path(self, key: str) -> str:
+        # Shard by key prefix to keep directories small
+        return os.path.join(self.directory, key[:2], key)
+
+    def _scan(self) -> OrderedDict:
+        """Files in the directory, least recently used first"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith('.tmp'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name, stat.st_size))
+        return OrderedDict((name, size) for _, name, size in sorted(entries))
+
+    def _rescan(self):
+        """Replace the index with what is on disk, including other processes' files"""
+        index = self._scan()
+        with self._lock:
+            self._index = index
+            self._total_bytes = sum(index.values())
+            self._next_scan = time.time() + self.scan_interval
+
+    def path(self, key: str) -> Optional[str]:
+        """Path of a cached file, marking it most recently used, or None on a miss"""
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+                if key in self._index:
+                    self._total_bytes -= self._index.pop(key)
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key not in self._index:
+                # Written by another process sharing the directory
+                self._index[key] = size
+                self._total_bytes += size
+            self._index.move_to_end(key)
+        return path
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached bytes, or None on a miss"""
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key: str, data: bytes):
+        """Store bytes atomically, evicting least recently used files over budget"""
+        if len(data) > self.max_bytes:
+            return
+
+        def write(f):
+            f.write(data)
+            return len(data)
+
+        self._store(key, write)
+
+    def set_from(self, key: str, source, chunk_size: int = 256 * 1024) -> Optional[str]:
+        """
+        Copy a readable file object into the cache one chunk at a time
+
+        Only one chunk is held in memory, whatever the file's size.
+
+        Returns:
+            Path of the cached file, or None if it is over budget or the write failed
+        """
+        def write(f):
+            size = 0
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    return size
+                size += len(chunk)
+                if size > self.max_bytes:
+                    return None
+                f.write(chunk)
+
+        return self._store(key, write)
+
+    def _store(self, key: str, write) -> Optional[str]:
+        """Write a temp file with write(f), returning its size, and rename it into place"""
+        path = self._path(key)
+        tmp_path = None
+        stored = False
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.tmp', dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                size = write(f)
+            if size is None:
+                return None
+            os.replace(tmp_path, path)
+            stored = True
+        except Exception as e:
+            # Disk errors, and read errors of the source (e.g. a corrupt GridFS file)
+            logger.warning(f"Disk cache write failed for {key}: {e}")
+            return None
+        finally:
+            if tmp_path is not None and not stored:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        if time.time() >= self._next_scan:
+            self._rescan()
+        with self._lock:
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = size
+            self._total_bytes += size
+            self._evict()
+        return path
+
+    def _evict(self):
+        """Remove least recently used files until under budget (caller holds the lock)"""
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def delete(self, key: str):
+        with self._lock:
+            self._total_bytes -= self._index.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def delete_prefix(self, prefix: str):
+        """
+        Remove every file whose key starts with prefix
+
+        Looks in the prefix's shard directory on disk, so files written by
+        other processes are removed too. prefix must be at least two
+        characters long.
+        """
+        try:
+            names = os.listdir(os.path.join(self.directory, prefix[:2]))
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(prefix):
+                self.delete(name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
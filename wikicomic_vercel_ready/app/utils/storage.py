@@ -0,0 +1,338 @@
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+import os
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from gridfs import GridFS
+from gridfs.errors import FileExists, NoFile
+
+from .cache import DiskCache
+from .derivatives import DERIVATIVE_FORMATS
+
+logger = logging.getLogger(__name__)
+
+
+def _open_file(path: str, content_type: str):
+    """Open a local file with the attributes of an ImageStore file, or None"""
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    f.length = os.fstat(f.fileno()).st_size
+    f.content_type = content_type
+    f.metadata = {"content_type": content_type}
+    return f
+
+
+class ImageStore(ABC):
+    """
+    Where image and derivative bytes are kept
+
+    Image documents stay in the images collection whichever store is used;
+    a store only holds the bytes, keyed by the image's ObjectId. Opened
+    files are seekable and carry length, content_type and metadata.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def put_image(self, image_id: ObjectId, data: bytes, filename: str, content_type: str,
+                  metadata: Dict[str, Any]):
+        """Store an original"""
+
+    @abstractmethod
+    def open_image(self, image_id: ObjectId):
+        """Open an original for streaming, or None if it is not stored"""
+
+    @abstractmethod
+    def put_derivative(self, image_id: ObjectId, width: int, fmt: str, data: bytes, content_type: str):
+        """Store a resized/transcoded copy of an original"""
+
+    @abstractmethod
+    def open_derivative(self, image_id: ObjectId, width: int, fmt: str):
+        """Open a stored resized/transcoded copy, or None if it is not stored yet"""
+
+    def image_path(self, image_id: ObjectId) -> Optional[str]:
+        """Local file of an original that can be served with send_file, if there is one"""
+        return None
+
+    def derivative_path(self, image_id: ObjectId, width: int, fmt: str) -> Optional[str]:
+        """Local file of a derivative that can be served with send_file, if there is one"""
+        return None
+
+    def delete(self, image_ids: List[ObjectId], session=None):
+        """Delete images and their derivatives as part of a database transaction"""
+
+    def purge(self, image_ids: List[ObjectId]):
+        """Delete what cannot take part in a transaction, once it has committed"""
+
+
+class GridFSImageStore(ImageStore):
+    """Images in the default GridFS bucket, derivatives in a second bucket"""
+
+    name = "gridfs"
+
+    def __init__(self, db, derivatives_bucket: str = "derivatives"):
+        self.db = db
+        self.fs = GridFS(db)
+        self.derivatives_bucket = derivatives_bucket
+        self.derivatives_fs = GridFS(db, collection=derivatives_bucket)
+
+    def put_image(self, image_id, data, filename, content_type, metadata):
+        # The file document carries everything the read path needs
+        self.fs.put(data, _id=image_id, filename=filename, content_type=content_type, metadata=metadata)
+
+    def open_image(self, image_id):
+        try:
+            return self.fs.get(image_id)
+        except NoFile:
+            return None
+
+    def put_derivative(self, image_id, width, fmt, data, content_type):
+        # A deterministic _id lets concurrent first requests race safely:
+        # the loser's write fails on the unique chunk/file index and is dropped
+        try:
+            self.derivatives_fs.put(
+                data,
+                _id=f"{image_id}_w{width}.{fmt}",
+                filename=f"{image_id}_w{width}.{fmt}",
+                metadata={
+                    "image_id": image_id,
+                    "width": width,
+                    "format": fmt,
+                    "content_type": content_type,
+                    "created_at": datetime.utcnow()
+                }
+            )
+        except FileExists:
+            logger.debug(f"Derivative {image_id}_w{width}.{fmt} was stored by another request")
+
+    def open_derivative(self, image_id, width, fmt):
+        return self.derivatives_fs.find_one({
+            "metadata.image_id": image_id,
+            "metadata.width": width,
+            "metadata.format": fmt
+        })
+
+    def delete(self, image_ids, session=None):
+        """Delete files, chunks and derivatives with one $in delete per collection"""
+        if not image_ids:
+            return
+        self.db["fs.files"].delete_many({"_id": {"$in": image_ids}}, session=session)
+        self.db["fs.chunks"].delete_many({"files_id": {"$in": image_ids}}, session=session)
+
+        derivative_files = self.db[f"{self.derivatives_bucket}.files"]
+        derivative_ids = [
+            doc["_id"] for doc in derivative_files.find(
+                {"metadata.image_id": {"$in": image_ids}}, {"_id": 1}, session=session
+            )
+        ]
+        if derivative_ids:
+            derivative_files.delete_many({"_id": {"$in": derivative_ids}}, session=session)
+            self.db[f"{self.derivatives_bucket}.chunks"].delete_many(
+                {"files_id": {"$in": derivative_ids}}, session=session
+            )
+
+
+class FileImageStore(ImageStore):
+    """
+    Content-addressed blob store on the local filesystem
+
+    Originals are written once to blobs/<aa>/<bb>/<sha256> and hard linked
+    from images/<shard>/<image_id>/original, where the shard is taken from
+    sha256(image_id); identical images share one blob. Derivatives are
+    plain files next to the link. Everything is written to a temp file and
+    renamed into place, and served with send_file, which uses sendfile
+    where the server supports it.
+
+    Images not found on disk are read from fallback (normally the GridFS
+    store), so a deployment can switch stores without migrating old images.
+    """
+
+    name = "file"
+
+    def __init__(self, directory: str, fallback: Optional[ImageStore] = None):
+        self.directory = directory
+        self.fallback = fallback
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "images"), exist_ok=True)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "blobs", digest[:2], digest[2:4], digest)
+
+    def _image_dir(self, image_id: ObjectId) -> str:
+        shard = hashlib.sha256(str(image_id).encode()).hexdigest()[:2]
+        return os.path.join(self.directory, "images", shard, str(image_id))
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _digest(self, path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def put_image(self, image_id, data, filename, content_type, metadata):
+        blob = self._blob_path(hashlib.sha256(data).hexdigest())
+        if not os.path.exists(blob):
+            self._write(blob, data)
+
+        link = os.path.join(self._image_dir(image_id), "original")
+        os.makedirs(os.path.dirname(link), exist_ok=True)
+        tmp_link = f"{link}.tmp"
+        try:
+            os.link(blob, tmp_link)
+            os.replace(tmp_link, link)
+        except OSError:
+            # No hard links on this filesystem: keep a private copy
+            self._write(link, data)
+
+    def image_path(self, image_id):
+        path = os.path.join(self._image_dir(image_id), "original")
+        return path if os.path.exists(path) else None
+
+    def open_image(self, image_id):
+        # Originals are always stored as PNG by store_image
+        image = _open_file(os.path.join(self._image_dir(image_id), "original"), "image/png")
+        if image is None and self.fallback is not None:
+            return self.fallback.open_image(image_id)
+        return image
+
+    def derivative_path(self, image_id, width, fmt):
+        path = os.path.join(self._image_dir(image_id), f"w{width}.{fmt}")
+        return path if os.path.exists(path) else None
+
+    def put_derivative(self, image_id, width, fmt, data, content_type):
+        self._write(os.path.join(self._image_dir(image_id), f"w{width}.{fmt}"), data)
+
+    def open_derivative(self, image_id, width, fmt):
+        return _open_file(os.path.join(self._image_dir(image_id), f"w{width}.{fmt}"), DERIVATIVE_FORMATS[fmt])
+
+    def delete(self, image_ids, session=None):
+        if self.fallback is not None:
+            self.fallback.delete(image_ids, session=session)
+
+    def purge(self, image_ids):
+        """Unlink image directories, and blobs no other image links to"""
+        for image_id in image_ids:
+            image_dir = self._image_dir(image_id)
+            try:
+                names = os.listdir(image_dir)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(image_dir, name)
+                try:
+                    if name == "original" and os.stat(path).st_nlink == 2:
+                        # Only the blob itself is left linking to this content
+                        os.remove(self._blob_path(self._digest(path)))
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Failed to remove {path}: {e}")
+            try:
+                os.rmdir(image_dir)
+            except OSError:
+                pass
+
+
+class DiskCachedImageStore(ImageStore):
+    """
+    Read-through DiskCache in front of a remote store (GridFS)
+
+    The first read of an image or derivative copies it into the cache
+    directory chunk by chunk; later reads are served from disk with
+    send_file and never reach MongoDB. The DiskCache bounds the directory
+    by total bytes with LRU eviction and writes files atomically, so the
+    workers on one node share it. Files that cannot be cached (larger than
+    the cache, or a failed copy) are streamed from the remote store.
+    """
+
+    def __init__(self, store: ImageStore, cache: DiskCache):
+        self.store = store
+        self.cache = cache
+        self.name = store.name
+
+    def _fill(self, key: str, remote):
+        """
+        Copy a remote file into the cache unless it is there already
+
+        Returns:
+            Tuple of (cached path, None), or (None, the open remote file
+            rewound for streaming) when it could not be cached, or
+            (None, None) when the remote store does not have it
+        """
+        path = self.cache.path(key)
+        if path is not None:
+            return path, None
+        image = remote()
+        if image is None:
+            return None, None
+        try:
+            # Files larger than the whole cache are not worth reading twice
+            if getattr(image, "length", 0) <= self.cache.max_bytes:
+                path = self.cache.set_from(key, image, getattr(image, "chunk_size", 256 * 1024))
+            if path is None:
+                image.seek(0)
+                return None, image
+        except BaseException:
+            image.close()
+            raise
+        image.close()
+        return path, None
+
+    def _path(self, key: str, remote) -> Optional[str]:
+        path, image = self._fill(key, remote)
+        if image is not None:
+            image.close()
+        return path
+
+    def put_image(self, image_id, data, filename, content_type, metadata):
+        self.store.put_image(image_id, data, filename, content_type, metadata)
+
+    def image_path(self, image_id):
+        return self._path(str(image_id), lambda: self.store.open_image(image_id))
+
+    def open_image(self, image_id):
+        path, image = self._fill(str(image_id), lambda: self.store.open_image(image_id))
+        if path is None:
+            return image
+        # Originals are always stored as PNG by store_image
+        return _open_file(path, "image/png") or self.store.open_image(image_id)
+
+    def put_derivative(self, image_id, width, fmt, data, content_type):
+        self.store.put_derivative(image_id, width, fmt, data, content_type)
+        self.cache.set(f"{image_id}_w{width}.{fmt}", data)
+
+    def derivative_path(self, image_id, width, fmt):
+        return self._path(f"{image_id}_w{width}.{fmt}", lambda: self.store.open_derivative(image_id, width, fmt))
+
+    def open_derivative(self, image_id, width, fmt):
+        path, image = self._fill(f"{image_id}_w{width}.{fmt}", lambda: self.store.open_derivative(image_id, width, fmt))
+        if path is None:
+            return image
+        return _open_file(path, DERIVATIVE_FORMATS[fmt]) or self.store.open_derivative(image_id, width, fmt)
+
+    def delete(self, image_ids, session=None):
+        self.store.delete(image_ids, session=session)
+
+    def purge(self, image_ids):
+        self.store.purge(image_ids)
+        for image_id in image_ids:
+            self.cache.delete_prefix(str(image_id))
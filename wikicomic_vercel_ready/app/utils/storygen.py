@@ -2,12 +2,75 @@ import os
 import logging
 import re
 import json
+import hashlib
+import asyncio
 import groq  # pip install groq
 from flask import current_app
+from ..config import Config
+from ..database import db_manager
+from .aio import async_runner
+from .cache import PersistentCache
 
 logger = logging.getLogger(__name__)
 
+class _SceneParser:
+    """
+    Incremental parser for scene blocks in model output
+
+    feed() takes one line at a time and returns a scene as soon as it has both
+    a prompt and a dialogue. Scenes missing either are returned when the next
+    scene starts, or by finish() at the end of the input.
+    """
+
+    def __init__(self):
+        self.current_scene = {}
+        self.yielded = False
+        self.count = 0
+
+    def feed(self, line):
+        line = line.strip()
+        if not line:
+            return None
+
+        ready = None
+        if line.lower().startswith('scene'):
+            if self.current_scene and not self.yielded:
+                self.count += 1
+                ready = self.current_scene
+            self.current_scene = {'scene_number': self.count + 1}
+            self.yielded = False
+        elif line.startswith('- prompt:'):
+            self.current_scene['prompt'] = line.replace('- prompt:', '').strip().strip('"')
+        elif line.startswith('- dialogue:'):
+            self.current_scene['dialogue'] = line.replace('- dialogue:', '').strip().strip('"')
+        elif line.startswith('- narration:'):
+            self.current_scene['narration'] = line.replace('- narration:', '').strip().strip('"')
+
+        if ready is None and not self.yielded and 'prompt' in self.current_scene and 'dialogue' in self.current_scene:
+            self.yielded = True
+            self.count += 1
+            ready = self.current_scene
+        return ready
+
+    def finish(self):
+        # Add the last scene
+        if self.current_scene and not self.yielded:
+            self.yielded = True
+            return self.current_scene
+        return None
+
+
 class StoryGenerator:
+    """
+    Storyline and scene generation with Groq
+
+    The async methods (agenerate_*, astream_*) are the implementation and run
+    on the shared async_runner loop. The sync methods are thin wrappers that
+    block on them, for callers outside the event loop.
+    """
+
+    MODEL = "llama-3.1-8b-instant"
+
     STYLE_PROMPTS = {
         'Manga': {
             'name': 'MANGA MADNESS',
@@ -50,9 +113,67 @@ class StoryGenerator:
     def __init__(self, api_key=None):
         if api_key is None:
             api_key = os.getenv('GROQ_API_KEY') or current_app.config.get('GROQ_API_KEY')
-        self.client = groq.Client(api_key=api_key)
+        self.client = groq.AsyncClient(api_key=api_key)
+        self._semaphore = asyncio.Semaphore(Config.GROQ_MAX_CONCURRENCY)
+        self.cache = PersistentCache(
+            "story",
+            store=db_manager,
+            max_entries=Config.STORY_CACHE_MAX_ENTRIES,
+            ttl=Config.STORY_CACHE_TTL
+        )
 
-    def generate_storyline(self, title, content, summary, categories, target_length="medium", style="Manga"):
+    def _cache_key(self, kind, title, revision_id, target_length, style, *extra):
+        """
+        Key for cached generations of one revision of an article
+
+        Style and length fall back the same way the prompts do, so an unknown
+        value shares entries with the default it resolves to.
+        """
+        style_key = style if style in self.STYLE_PROMPTS else 'Manga'
+        length_key = target_length if target_length in self.LENGTH_SETTINGS else 'medium'
+        normalized_title = " ".join(title.split()).casefold()
+        return ":".join([kind, normalized_title, str(revision_id), style_key, length_key, *extra])
+
+    def _storyline_digest(self, storyline):
+        return hashlib.sha1(storyline.encode('utf-8')).hexdigest()[:16]
+
+    async def _cache_get(self, key):
+        # The persistent level is a blocking Mongo call; keep it off the loop
+        return await asyncio.to_thread(self.cache.get, key)
+
+    async def _cache_set(self, key, value):
+        await asyncio.to_thread(self.cache.set, key, value)
+
+    async def _complete(self, prompt, **kwargs):
+        """Chat completion for a single user prompt, limited by GROQ_MAX_CONCURRENCY"""
+        async with self._semaphore:
+            return await self.client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=self.MODEL,
+                **kwargs
+            )
+
+    STRUCTURED_STORY_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "storyline": {"type": "string"},
+            "scenes": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "prompt": {"type": "string"},
+                        "dialogue": {"type": "string"},
+                        "narration": {"type": "string"}
+                    },
+                    "required": ["prompt", "dialogue"]
+                }
+            }
+        },
+        "required": ["storyline", "scenes"]
+    }
+
+    def _build_storyline_prompt(self, title, content, summary, categories, target_length="medium", style="Manga"):
         style_info = self.STYLE_PROMPTS.get(style, self.STYLE_PROMPTS['Manga'])
         length_info = self.LENGTH_SETTINGS.get(target_length, self.LENGTH_SETTINGS['medium'])
         word_count = length_info['words']
@@ -116,22 +237,147 @@ Story Structure:
 
 Output a compelling comic book storyline that educates while entertaining, with strong visual elements and clear character interactions that will translate beautifully to comic panels."""
 
+        return prompt
+
+    def generate_storyline(self, title, content, summary, categories, target_length="medium", style="Manga",
+                           revision_id=None):
+        """Synchronous wrapper around agenerate_storyline"""
+        return async_runner.run(self.agenerate_storyline(
+            title, content, summary, categories, target_length, style, revision_id
+        ))
+
+    async def agenerate_storyline(self, title, content, summary, categories, target_length="medium", style="Manga",
+                                  revision_id=None):
+        """
+        Generate a storyline for an article
+
+        When revision_id is given, results are cached per article revision,
+        style and length, so repeat requests skip the LLM until the article
+        changes.
+        """
+        cache_key = None
+        if revision_id is not None:
+            cache_key = self._cache_key("storyline", title, revision_id, target_length, style)
+            cached = await self._cache_get(cache_key)
+            if cached:
+                return cached
+
+        prompt = self._build_storyline_prompt(title, content, summary, categories, target_length, style)
+
         try:
-            response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.1-8b-instant",
+            response = await self._complete(prompt, temperature=0.7, max_tokens=2000)
+            storyline = response.choices[0].message.content
+            if cache_key and storyline:
+                await self._cache_set(cache_key, storyline)
+            return storyline
+        except Exception as e:
+            logger.error(f"Error generating storyline: {e}")
+            return None
+
+    def generate_storyline_and_scenes(self, title, content, summary, categories, target_length="medium", style="Manga",
+                                      revision_id=None):
+        """Synchronous wrapper around agenerate_storyline_and_scenes"""
+        return async_runner.run(self.agenerate_storyline_and_scenes(
+            title, content, summary, categories, target_length, style, revision_id
+        ))
+
+    async def agenerate_storyline_and_scenes(self, title, content, summary, categories, target_length="medium",
+                                             style="Manga", revision_id=None):
+        """
+        Generate the storyline and its scenes in a single JSON-mode completion
+
+        Saves the second round trip of generate_storyline followed by
+        generate_scene_prompts_and_dialogues, and the input tokens of sending
+        the storyline back. Returns (storyline, scenes), or None if the request
+        fails or the response does not match STRUCTURED_STORY_SCHEMA so the
+        caller can fall back to the two-call path. Cached per article revision
+        like generate_storyline.
+        """
+        cache_key = None
+        if revision_id is not None:
+            cache_key = self._cache_key("structured", title, revision_id, target_length, style)
+            cached = await self._cache_get(cache_key)
+            if cached:
+                return cached["storyline"], cached["scenes"]
+
+        style_info = self.STYLE_PROMPTS.get(style, self.STYLE_PROMPTS['Manga'])
+        num_scenes = self.expected_scene_count(target_length)
+        story_prompt = self._build_storyline_prompt(title, content, summary, categories, target_length, style)
+
+        prompt = f"""{story_prompt}
+
+Then adapt that storyline into exactly {num_scenes} comic scenes for {style_info['name']} style:
+- prompt: an EXTREMELY detailed visual description including character poses, expressions, setting, lighting, mood, camera angles, panel composition and environmental details, matching: {style_info['prompt']}
+- dialogue: meaningful, {style_info['tone']} character conversations that advance the story and work in speech bubbles
+- narration: optional narrator caption
+
+Respond ONLY with a JSON object matching this JSON schema:
+{json.dumps(self.STRUCTURED_STORY_SCHEMA)}"""
+
+        try:
+            response = await self._complete(
+                prompt,
                 temperature=0.7,
-                max_tokens=2000,
+                max_tokens=6000,
+                response_format={"type": "json_object"},
             )
-            return response.choices[0].message.content
+            data = json.loads(response.choices[0].message.content)
         except Exception as e:
-            logger.error(f"Error generating storyline: {e}")
+            logger.error(f"Error generating structured story: {e}")
+            return None
+
+        structured = self._validate_structured_story(data, num_scenes)
+        if cache_key and structured:
+            storyline, scenes = structured
+            await self._cache_set(cache_key, {"storyline": storyline, "scenes": scenes})
+        return structured
+
+    def _validate_structured_story(self, data, expected_scenes):
+        """Check a structured story response; returns (storyline, scenes) or None"""
+        if not isinstance(data, dict):
+            logger.warning("Structured story is not a JSON object")
+            return None
+
+        storyline = data.get("storyline")
+        if not isinstance(storyline, str) or not storyline.strip():
+            logger.warning("Structured story has no storyline")
             return None
 
-    def generate_scene_prompts_and_dialogues(self, title, storyline, target_length="medium", comic_style='Manga'):
+        scenes = []
+        for item in data.get("scenes") or []:
+            if not isinstance(item, dict):
+                continue
+            prompt = item.get("prompt")
+            dialogue = item.get("dialogue")
+            if not isinstance(prompt, str) or not prompt.strip() or not isinstance(dialogue, str):
+                continue
+            scene = {
+                'scene_number': len(scenes) + 1,
+                'prompt': prompt.strip(),
+                'dialogue': dialogue.strip()
+            }
+            if isinstance(item.get("narration"), str):
+                scene['narration'] = item["narration"].strip()
+            scenes.append(scene)
+
+        if not scenes:
+            logger.warning("Structured story has no valid scenes")
+            return None
+
+        # Ensure we have the expected number of scenes
+        while len(scenes) < expected_scenes:
+            scenes.append(self._filler_scene(len(scenes) + 1))
+
+        return storyline, scenes[:expected_scenes]
+
+    def expected_scene_count(self, target_length="medium"):
+        """Number of scenes generated for a comic length"""
+        return self.LENGTH_SETTINGS.get(target_length, self.LENGTH_SETTINGS['medium'])['scenes']
+
+    def _build_scene_prompt(self, title, storyline, target_length="medium", comic_style='Manga'):
+        """Build the scene generation prompt; returns (prompt, number of scenes)"""
         style_info = self.STYLE_PROMPTS.get(comic_style, self.STYLE_PROMPTS['Manga'])
-        length_info = self.LENGTH_SETTINGS.get(target_length, self.LENGTH_SETTINGS['medium'])
-        num_scenes = length_info['scenes']
+        num_scenes = self.expected_scene_count(target_length)
 
         system_prompt = f"""You are a professional comic writer and visual artist specializing in {style_info['name']} style. Create {num_scenes} highly detailed scenes for a comic titled '{title}'.
 
@@ -180,54 +426,162 @@ Scene X:
 
 Create exactly {num_scenes} scenes that tell the complete story with maximum visual detail and engaging dialogue."""
 
-        try:
-            response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": system_prompt}],
-                model="llama-3.1-8b-instant",
-                temperature=0.8,
-                max_tokens=4000,
+        return system_prompt, num_scenes
+
+    def generate_scene_prompts_and_dialogues(self, title, storyline, target_length="medium", comic_style='Manga',
+                                             revision_id=None):
+        """Synchronous wrapper around agenerate_scene_prompts_and_dialogues"""
+        return async_runner.run(self.agenerate_scene_prompts_and_dialogues(
+            title, storyline, target_length, comic_style, revision_id
+        ))
+
+    async def agenerate_scene_prompts_and_dialogues(self, title, storyline, target_length="medium",
+                                                    comic_style='Manga', revision_id=None):
+        """
+        Generate scene prompts and dialogues for a storyline
+
+        When revision_id is given, results are cached per article revision,
+        style, length and storyline.
+        """
+        cache_key = None
+        if revision_id is not None:
+            cache_key = self._cache_key(
+                "scenes", title, revision_id, target_length, comic_style, self._storyline_digest(storyline)
             )
+            cached = await self._cache_get(cache_key)
+            if cached:
+                return cached
+
+        system_prompt, num_scenes = self._build_scene_prompt(title, storyline, target_length, comic_style)
+
+        try:
+            response = await self._complete(system_prompt, temperature=0.8, max_tokens=4000)
             
             content = response.choices[0].message.content
-            return self._parse_scenes(content, num_scenes)
+            scenes = self._parse_scenes(content, num_scenes)
+            if cache_key:
+                await self._cache_set(cache_key, scenes)
+            return scenes
             
         except Exception as e:
             logger.error(f"Error generating scenes: {e}")
             return []
 
-    def _parse_scenes(self, content, expected_scenes):
-        """Parse the AI response into structured scene data"""
+    def stream_scene_prompts_and_dialogues(self, title, storyline, target_length="medium", comic_style='Manga',
+                                           revision_id=None):
+        """Synchronous wrapper around astream_scene_prompts_and_dialogues"""
+        yield from async_runner.iterate(self.astream_scene_prompts_and_dialogues(
+            title, storyline, target_length, comic_style, revision_id
+        ))
+
+    async def astream_scene_prompts_and_dialogues(self, title, storyline, target_length="medium",
+                                                  comic_style='Manga', revision_id=None):
+        """
+        Streaming variant of generate_scene_prompts_and_dialogues
+
+        Reads the completion incrementally and yields each scene as soon as its
+        prompt and dialogue lines are complete, so image generation can start
+        while the model is still writing later scenes. Yields nothing if the
+        request fails before any scene is decoded. Shares its cache entries
+        with generate_scene_prompts_and_dialogues.
+        """
+        cache_key = None
+        if revision_id is not None:
+            cache_key = self._cache_key(
+                "scenes", title, revision_id, target_length, comic_style, self._storyline_digest(storyline)
+            )
+            cached = await self._cache_get(cache_key)
+            if cached:
+                for scene in cached:
+                    yield scene
+                return
+
+        system_prompt, num_scenes = self._build_scene_prompt(title, storyline, target_length, comic_style)
         scenes = []
-        lines = content.split('\n')
-        current_scene = {}
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
+
+        try:
+            async with self._semaphore:
+                stream = await self.client.chat.completions.create(
+                    messages=[{"role": "user", "content": system_prompt}],
+                    model=self.MODEL,
+                    temperature=0.8,
+                    max_tokens=4000,
+                    stream=True,
+                )
+
+                try:
+                    parser = _SceneParser()
+                    async for line in self._aiter_stream_lines(stream):
+                        scene = parser.feed(line)
+                        if scene is not None:
+                            scenes.append(scene)
+                            yield scene
+                            if len(scenes) >= num_scenes:
+                                break
+                    else:
+                        scene = parser.finish()
+                        if scene is not None:
+                            scenes.append(scene)
+                            yield scene
+                finally:
+                    await stream.close()
+
+        except Exception as e:
+            logger.error(f"Error streaming scenes: {e}")
+            if not scenes:
+                return
+            cache_key = None  # Don't cache a truncated completion
+
+        # Ensure we have the expected number of scenes
+        while len(scenes) < num_scenes:
+            scene = self._filler_scene(len(scenes) + 1)
+            scenes.append(scene)
+            yield scene
+
+        if cache_key:
+            await self._cache_set(cache_key, scenes)
+
+    async def _aiter_stream_lines(self, stream):
+        """Yield complete lines from a streamed chat completion"""
+        buffer = ""
+        async for chunk in stream:
+            if not chunk.choices:
                 continue
-                
-            if line.lower().startswith('scene'):
-                if current_scene:
-                    scenes.append(current_scene)
-                current_scene = {'scene_number': len(scenes) + 1}
-            elif line.startswith('- prompt:'):
-                current_scene['prompt'] = line.replace('- prompt:', '').strip().strip('"')
-            elif line.startswith('- dialogue:'):
-                current_scene['dialogue'] = line.replace('- dialogue:', '').strip().strip('"')
-            elif line.startswith('- narration:'):
-                current_scene['narration'] = line.replace('- narration:', '').strip().strip('"')
-        
-        # Add the last scene
-        if current_scene:
-            scenes.append(current_scene)
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            buffer += delta
+            *lines, buffer = buffer.split('\n')
+            for line in lines:
+                yield line
+        if buffer:
+            yield buffer
+
+    def _iter_scenes(self, lines):
+        """Parse scene blocks from lines of model output (see _SceneParser)"""
+        parser = _SceneParser()
+        for line in lines:
+            scene = parser.feed(line)
+            if scene is not None:
+                yield scene
+        scene = parser.finish()
+        if scene is not None:
+            yield scene
+
+    def _filler_scene(self, scene_number):
+        return {
+            'scene_number': scene_number,
+            'prompt': f"Scene {scene_number} continuation of the story with detailed visual elements, character interactions, and atmospheric details",
+            'dialogue': "Character: Let's continue our journey and explore this fascinating topic.",
+            'narration': "The story continues with new discoveries and insights..."
+        }
+
+    def _parse_scenes(self, content, expected_scenes):
+        """Parse the AI response into structured scene data"""
+        scenes = list(self._iter_scenes(content.split('\n')))
         
         # Ensure we have the expected number of scenes
         while len(scenes) < expected_scenes:
-            scenes.append({
-                'scene_number': len(scenes) + 1,
-                'prompt': f"Scene {len(scenes) + 1} continuation of the story with detailed visual elements, character interactions, and atmospheric details",
-                'dialogue': "Character: Let's continue our journey and explore this fascinating topic.",
-                'narration': "The story continues with new discoveries and insights..."
-            })
+            scenes.append(self._filler_scene(len(scenes) + 1))
         
         return scenes[:expected_scenes]
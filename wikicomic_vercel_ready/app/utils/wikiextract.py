@@ -1,4 +1,5 @@
 import wikipedia
+import requests
 import os
 import re
 import logging
@@ -9,8 +10,25 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class WikipediaExtractor:
-    def __init__(self, language="en"):
+    PAGE_FIELDS = ("title", "url", "content", "summary", "references",
+                   "categories", "links", "images", "revision_id")
+    # Fields available from a single MediaWiki action=query request
+    QUERY_FIELDS = {"title", "url", "content", "summary", "categories", "revision_id"}
+    USER_AGENT = "WikiComic/1.0 (https://github.com/SytherAsh/WikiComic)"
+
+    def __init__(self, language="en", cache=None):
+        """
+        Args:
+            language: Wikipedia language code
+            cache: Optional cache with get(key) and set(key, value), such as
+                PersistentCache. Pages are stored by resolved title and
+                revalidated against the latest revision id on every lookup.
+        """
         wikipedia.set_lang(language)
+        self.api_url = f"https://{language}.wikipedia.org/w/api.php"
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = self.USER_AGENT
+        self.cache = cache
 
     def sanitize_filename(self, filename: str) -> str:
         sanitized = re.sub(r'[\\/*?:"<>|]', '_', filename)
@@ -25,20 +43,39 @@ class WikipediaExtractor:
             logger.error(f"Wikipedia search error: {e}")
             return []
 
-    def get_page_info(self, title: str):
+    def get_page_info(self, title: str, fields=None):
+        """
+        Fetch a Wikipedia article
+
+        Args:
+            title: Article title
+            fields: PAGE_FIELDS to fetch, defaults to all of them. Each field
+                costs its own (often paginated) request in the wikipedia
+                library, so callers should only ask for what they use. When
+                every requested field is in QUERY_FIELDS, the page is fetched
+                with one action=query request instead.
+
+        Returns:
+            Dictionary with the requested fields, or an "error" entry
+        """
+        requested = set(fields or self.PAGE_FIELDS) & set(self.PAGE_FIELDS)
         try:
-            page = wikipedia.page(title, auto_suggest=False)
-            return {
-                "title": page.title,
-                "url": page.url,
-                "content": page.content,
-                "summary": page.summary,
-                "references": page.references,
-                "categories": page.categories,
-                "links": page.links,
-                "images": page.images,
-                "timestamp": datetime.now().isoformat()
-            }
+            cache_key = entry = None
+            if self.cache is not None:
+                cache_key, entry, info = self._get_cached_page(title, requested)
+                if info is not None:
+                    return info
+
+            if requested <= self.QUERY_FIELDS:
+                # The revision id is free in a query request and keys the cache
+                info = self._query_page(title, requested | {"revision_id"})
+            else:
+                info = self._library_page(title, requested)
+            info["timestamp"] = datetime.now().isoformat()
+
+            if self.cache is not None and info.get("revision_id") is not None:
+                self._cache_page(cache_key or self._page_cache_key(info["title"]), entry, info)
+            return info
         except wikipedia.DisambiguationError as e:
             return {
                 "error": "Disambiguation Error",
@@ -57,3 +94,120 @@ class WikipediaExtractor:
                 "message": str(e)
             }
 
+    def _page_cache_key(self, resolved_title: str) -> str:
+        return " ".join(resolved_title.split()).casefold()
+
+    def _latest_revision(self, title: str):
+        """
+        Resolve redirects and get the latest revision id with one lightweight request
+
+        Returns:
+            Tuple of (resolved title, revision id), or None if unavailable
+        """
+        try:
+            response = self.session.get(self.api_url, params={
+                "action": "query",
+                "format": "json",
+                "formatversion": 2,
+                "titles": title,
+                "redirects": 1,
+                "prop": "info"
+            }, timeout=5)
+            response.raise_for_status()
+            pages = response.json().get("query", {}).get("pages", [])
+            if not pages or pages[0].get("missing") or pages[0].get("invalid"):
+                return None
+            return pages[0]["title"], pages[0].get("lastrevid")
+        except Exception as e:
+            logger.warning(f"Wikipedia revision check failed for {title}: {e}")
+            return None
+
+    def _get_cached_page(self, title: str, fields):
+        """
+        Look up a cached page and check it is still the latest revision
+
+        Returns:
+            Tuple of (cache key or None, cached entry or None, page info or None)
+        """
+        latest = self._latest_revision(title)
+        if latest is None:
+            return None, None, None
+
+        resolved_title, revision_id = latest
+        cache_key = self._page_cache_key(resolved_title)
+        entry = self.cache.get(cache_key)
+        if not entry or entry.get("revision_id") != revision_id or not fields <= set(entry):
+            return cache_key, entry, None
+
+        info = {"title": entry["title"], "url": entry.get("url")}
+        for field in fields:
+            info[field] = entry[field]
+        info["timestamp"] = datetime.now().isoformat()
+        return cache_key, entry, info
+
+    def _cache_page(self, cache_key: str, entry, info):
+        """Store page info, merging the fields of entry if it is the same revision"""
+        if not entry or entry.get("revision_id") != info["revision_id"]:
+            entry = {}
+        entry.update({k: v for k, v in info.items() if k != "timestamp"})
+        self.cache.set(cache_key, entry)
+
+    def _library_page(self, title: str, fields):
+        """Load a page with the wikipedia library, reading only the requested properties"""
+        page = wikipedia.page(title, auto_suggest=False)
+        # Title and URL are known once the page loads; the rest are lazy requests
+        info = {"title": page.title, "url": page.url}
+        for field in fields:
+            if field not in info:
+                info[field] = getattr(page, field)
+        return info
+
+    def _query_page(self, title: str, fields):
+        """Fetch the requested QUERY_FIELDS with a single action=query request"""
+        props = ["info", "pageprops"]
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": 2,
+            "titles": title,
+            "redirects": 1,
+            "inprop": "url",
+            "ppprop": "disambiguation"
+        }
+        if "content" in fields or "summary" in fields:
+            props.append("extracts")
+            params["explaintext"] = 1
+            if "content" not in fields:
+                params["exintro"] = 1
+        if "categories" in fields:
+            props.append("categories")
+            params["cllimit"] = "max"
+        params["prop"] = "|".join(props)
+
+        response = self.session.get(self.api_url, params=params, timeout=10)
+        response.raise_for_status()
+        pages = response.json().get("query", {}).get("pages", [])
+        if not pages or pages[0].get("missing") or pages[0].get("invalid"):
+            raise wikipedia.PageError(title)
+
+        page = pages[0]
+        if "disambiguation" in page.get("pageprops", {}):
+            # Let the wikipedia library collect the disambiguation options
+            return self._library_page(title, fields)
+
+        info = {"title": page["title"], "url": page.get("fullurl")}
+        if "revision_id" in fields:
+            info["revision_id"] = page.get("lastrevid")
+        if "content" in fields or "summary" in fields:
+            extract = page.get("extract", "")
+            if "content" in fields:
+                info["content"] = extract
+            if "summary" in fields:
+                # The summary is the lead section, before the first heading
+                info["summary"] = re.split(r'\n\s*==[^=]', extract, maxsplit=1)[0].strip()
+        if "categories" in fields:
+            info["categories"] = [
+                re.sub(r'^Category:', '', category["title"])
+                for category in page.get("categories", [])
+            ]
+        return info